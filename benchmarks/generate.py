@@ -0,0 +1,155 @@
+"""Generator of synthetic data directories for the benchmarks"""
+
+import random
+from pathlib import Path
+from typing import NamedTuple
+
+BASE16_KEYS = [f"base0{i:X}" for i in range(16)]
+"""Keys of a base16 palette"""
+
+TEMPLATE_VARS = [
+    *(f"colors.{key}" for key in BASE16_KEYS),
+    "colors.alt_red",
+    "colors.alt_green",
+    "colors.orange",
+    "typography.font",
+    "typography.size",
+    "appearance.gtk",
+]
+"""Variables read by the generated templates"""
+
+FILES_PER_DIR = 50
+"""Number of templates in every directory of the generated fileset"""
+
+
+class Scale(NamedTuple):
+    """Size of a synthetic data directory
+
+    :param colorschemes: Number of colorschemes
+    :param depth: Length of the ``extends`` chains of colorschemes. Colorschemes are
+        split in chains of this length, and only the first one of every chain
+        defines a full palette
+    :param templates: Number of templates in the fileset
+    :param template_lines: Number of lines of every template
+    """
+
+    colorschemes: int
+    depth: int
+    templates: int
+    template_lines: int
+
+    @property
+    def name(self) -> str:
+        """Short name that identifies the scale in the results"""
+        return (
+            f"c{self.colorschemes}-d{self.depth}"
+            f"-t{self.templates}-l{self.template_lines}"
+        )
+
+
+def _random_color(rng: random.Random) -> str:
+    return f"#{rng.randrange(0x1000000):06x}"
+
+
+def get_colorscheme_id(chain: int, level: int) -> str:
+    """Get the ID of a generated colorscheme
+
+    :param chain: Index of the ``extends`` chain
+    :param level: Position in the chain. Level 0 doesn't extend anything
+    :returns: Colorscheme ID
+    """
+    return f"chain{chain}-level{level}"
+
+
+def write_colorschemes(dir: Path, scale: Scale, rng: random.Random) -> None:
+    """Write the colorschemes of a synthetic data directory
+
+    :param dir: Colorschemes directory
+    :param scale: Size of the data
+    :param rng: Random number generator for the colors
+    """
+    dir.mkdir(parents=True)
+
+    for i in range(scale.colorschemes):
+        chain, level = divmod(i, scale.depth)
+        lines = [f'name = "Chain {chain} level {level}"']
+
+        if level:
+            lines.append(f'extends = "{get_colorscheme_id(chain, level - 1)}"')
+            colors = {rng.choice(BASE16_KEYS): _random_color(rng)}
+        else:
+            colors = {key: _random_color(rng) for key in BASE16_KEYS}
+
+        lines += ["[custom]", f'level = "{level}"', "[colors.terminal]"]
+        lines.append("[colors.base16]")
+        lines += [f'{key} = "{value}"' for key, value in colors.items()]
+
+        (dir / f"{get_colorscheme_id(chain, level)}.toml").write_text(
+            "\n".join(lines) + "\n"
+        )
+
+
+def write_fileset(dir: Path, scale: Scale, rng: random.Random) -> None:
+    """Write the fileset of a synthetic data directory
+
+    :param dir: Fileset directory
+    :param scale: Size of the data
+    :param rng: Random number generator for the variables read by the templates
+    """
+    dir.mkdir(parents=True)
+    (dir / "settings.toml").write_text('name = "Benchmark"\n')
+
+    for i in range(scale.templates):
+        template_dir = dir / "config" / f"dir{i // FILES_PER_DIR}"
+        template_dir.mkdir(parents=True, exist_ok=True)
+
+        lines = [
+            f"option{j} = {{{{{rng.choice(TEMPLATE_VARS)}}}}}"
+            for j in range(scale.template_lines)
+        ]
+        (template_dir / f"file{i}.conf").write_text("\n".join(lines) + "\n")
+
+
+def generate_data_dir(root: Path, scale: Scale, seed: int = 0) -> None:
+    """Generate a data directory and a config directory with synthetic data.
+
+    The data directory is ``root/data`` and the config directory is ``root/config``.
+    The fileset is called ``benchmark``, and the typography and appearance are called
+    ``default``. The ID of the deepest colorscheme of the first chain is returned by
+    :func:`get_deepest_colorscheme_id`.
+
+    :param root: Directory where the data and config directories are created
+    :param scale: Size of the data
+    :param seed: Seed for the generated colors and templates
+    """
+    rng = random.Random(seed)
+    data_dir = root / "data"
+    config_dir = root / "config"
+
+    write_colorschemes(data_dir / "colorschemes", scale, rng)
+    write_fileset(data_dir / "filesets" / "benchmark", scale, rng)
+
+    (data_dir / "typographies").mkdir()
+    (data_dir / "typographies" / "default.toml").write_text(
+        'name = "Default"\n[custom]\nfont = "Iosevka"\nsize = "11"\n'
+    )
+    (data_dir / "appearances").mkdir()
+    (data_dir / "appearances" / "default.toml").write_text(
+        'name = "Default"\n[custom]\ngtk = "Adwaita"\n'
+    )
+    (data_dir / "hooks").mkdir()
+
+    config_dir.mkdir()
+    (config_dir / "config.toml").write_text(
+        f'[general]\ndata_path = "{data_dir}"\nout_path = "{data_dir / "out"}"\n'
+        '[colors]\ncolormode = "base16"\n'
+    )
+
+
+def get_deepest_colorscheme_id(scale: Scale) -> str:
+    """Get the ID of the colorscheme at the end of the first ``extends`` chain
+
+    :param scale: Size of the data
+    :returns: Colorscheme ID
+    """
+    return get_colorscheme_id(0, min(scale.depth, scale.colorschemes) - 1)
@@ -0,0 +1,320 @@
+"""End-to-end benchmarks of dotmix.
+
+Every scale generates a synthetic data directory (see :mod:`benchmarks.generate`)
+and times the CLI startup, data listing, data computation, change detection,
+:func:`dotmix.runner.apply` and the updates of watch mode. Results are written as
+JSON, and they can be compared with the results of a previous release to find
+regressions::
+
+    python -m benchmarks.run --scale small --scale medium -o results.json
+    python -m benchmarks.run --scale small --compare previous.json
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.generate import Scale, generate_data_dir, get_deepest_colorscheme_id
+
+SCALES = {
+    "small": Scale(colorschemes=10, depth=2, templates=50, template_lines=20),
+    "medium": Scale(colorschemes=100, depth=5, templates=500, template_lines=50),
+    "large": Scale(colorschemes=1000, depth=10, templates=2000, template_lines=100),
+}
+"""Predefined scales"""
+
+CLI_COMMANDS = [
+    ["--help"],
+    ["apply", "--help"],
+    ["colorscheme", "list"],
+    ["fileset", "list"],
+]
+"""Subcommands whose cold start time is measured"""
+
+REGRESSION_THRESHOLD = 1.2
+"""Ratio of medians from which a benchmark is reported as a regression"""
+
+Result = Dict[str, Any]
+
+
+def measure(
+    func: Callable[[], Any],
+    repeat: int,
+    setup: Optional[Callable[[], Any]] = None,
+) -> Dict[str, float]:
+    """Call a function several times and measure it
+
+    :param func: Function to measure
+    :param repeat: Number of calls
+    :param setup: Function called before every call. It's not measured
+    :returns: Minimum, median and maximum times in seconds
+    """
+    times: List[float] = []
+
+    for _ in range(repeat):
+        if setup:
+            setup()
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "max": max(times),
+    }
+
+
+def run_cli(args: List[str]) -> None:
+    """Run the CLI in a new interpreter
+
+    :param args: Command line arguments
+    """
+    subprocess.run(
+        [sys.executable, "-c", "from dotmix.cli import cli; cli()", *args],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def run_scale(scale: Scale, repeat: int) -> List[Result]:
+    """Generate a data directory and run every benchmark on it
+
+    :param scale: Size of the data
+    :param repeat: Number of times every benchmark is run
+    :returns: Results of the benchmarks
+    """
+    from dotmix.colorscheme import (
+        get_colorscheme_by_id,
+        get_colorschemes,
+        resolve_colorschemes,
+    )
+    from dotmix.colorutils import clear_color_caches
+    from dotmix.data import clear_data_caches
+    from dotmix.fileset import get_fileset_by_id, get_paths_from_fileset
+    from dotmix.runner import (
+        apply,
+        apply_changes,
+        check_fileset_changes,
+        get_out_dir,
+    )
+    from dotmix.template import get_template_cache
+
+    results: List[Result] = []
+
+    def add(name: str, times: Dict[str, float]) -> None:
+        results.append({"scale": scale._asdict(), "benchmark": name, **times})
+        print(f"  {name:<40} {times['median'] * 1000:>10.2f}ms", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory(prefix="dotmix-benchmark-") as tmp:
+        root = Path(tmp)
+        generate_data_dir(root, scale)
+        data_dir = root / "data"
+        os.environ["DOTMIX_DATA_DIR"] = str(data_dir)
+        os.environ["DOTMIX_CONFIG_DIR"] = str(root / "config")
+
+        def clear_caches() -> None:
+            clear_color_caches()
+            clear_data_caches()
+            get_template_cache.cache_clear()
+
+        def clear_output() -> None:
+            clear_caches()
+            for path in data_dir.iterdir():
+                if path.name.startswith("."):
+                    if path.is_dir():
+                        shutil.rmtree(path)
+                    else:
+                        path.unlink()
+            shutil.rmtree(data_dir / "out", ignore_errors=True)
+
+        for args in CLI_COMMANDS:
+            add(f"cli {' '.join(args)}", measure(lambda: run_cli(args), repeat))
+
+        add(
+            "get_colorschemes",
+            measure(get_colorschemes, repeat, clear_caches),
+        )
+
+        deepest = get_deepest_colorscheme_id(scale)
+        add(
+            "compute_data (deepest)",
+            measure(lambda: get_colorscheme_by_id(deepest).data, repeat, clear_caches),
+        )
+        add(
+            "compute_data (all)",
+            measure(
+                lambda: [c.data for c in get_colorschemes().values()],
+                repeat,
+                clear_caches,
+            ),
+        )
+        add(
+            "resolve_colorschemes",
+            measure(resolve_colorschemes, repeat, clear_caches),
+        )
+        add(
+            "get_paths_from_fileset",
+            measure(
+                lambda: get_paths_from_fileset(get_fileset_by_id("benchmark")),
+                repeat,
+                clear_caches,
+            ),
+        )
+
+        def run_apply(**kwargs) -> None:
+            apply(
+                fileset_id="benchmark",
+                colorscheme_id=deepest,
+                typography_id="default",
+                appearance_id="default",
+                **kwargs,
+            )
+
+        add("apply (cold)", measure(run_apply, repeat, clear_output))
+        add(
+            "apply (no changes, full)",
+            measure(lambda: run_apply(incremental=False), repeat, clear_caches),
+        )
+        add(
+            "apply (no changes, incremental)",
+            measure(lambda: run_apply(incremental=True), repeat, clear_caches),
+        )
+
+        template = next((data_dir / "filesets" / "benchmark").rglob("*.conf"))
+        edits = itertools.count()
+        add(
+            "apply (one template changed, incremental)",
+            measure(
+                lambda: run_apply(incremental=True),
+                repeat,
+                lambda: (
+                    clear_caches(),
+                    template.write_text(f"edit{next(edits)} = {{{{colors.base00}}}}"),
+                ),
+            ),
+        )
+        add(
+            "apply_changes (one template changed)",
+            measure(
+                lambda: apply_changes(
+                    fileset_id="benchmark",
+                    colorscheme_id=deepest,
+                    typography_id="default",
+                    appearance_id="default",
+                ),
+                repeat,
+                lambda: template.write_text(
+                    f"edit{next(edits)} = {{{{colors.base00}}}}"
+                ),
+            ),
+        )
+        add(
+            "check_fileset_changes",
+            measure(lambda: check_fileset_changes(get_out_dir()), repeat),
+        )
+
+    return results
+
+
+def compare(results: List[Result], previous: List[Result]) -> bool:
+    """Print the ratio between the medians of two runs
+
+    :param results: Current results
+    :param previous: Results of a previous run
+    :returns: True if any benchmark is slower than :data:`REGRESSION_THRESHOLD`
+    """
+    medians = {(Scale(**r["scale"]), r["benchmark"]): r["median"] for r in previous}
+    regression = False
+
+    for result in results:
+        key = (Scale(**result["scale"]), result["benchmark"])
+        if key not in medians:
+            continue
+
+        ratio = result["median"] / medians[key]
+        slower = ratio >= REGRESSION_THRESHOLD
+        regression = regression or slower
+        print(
+            f"{key[0].name:<24} {key[1]:<42} {ratio:>6.2f}x"
+            + (" REGRESSION" if slower else ""),
+            file=sys.stderr,
+        )
+
+    return regression
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scale",
+        action="append",
+        choices=SCALES.keys(),
+        help="Predefined scale to run (can be repeated)",
+    )
+    parser.add_argument(
+        "--custom",
+        action="append",
+        default=[],
+        metavar="COLORSCHEMES,DEPTH,TEMPLATES,LINES",
+        help="Custom scale to run (can be repeated)",
+    )
+    parser.add_argument("--repeat", "-r", type=int, default=5)
+    parser.add_argument("--output", "-o", type=Path, help="JSON file for the results")
+    parser.add_argument(
+        "--compare", type=Path, help="JSON file with results of a previous run"
+    )
+    args = parser.parse_args(argv)
+
+    scales = [SCALES[name] for name in args.scale or []]
+    scales += [Scale(*map(int, custom.split(","))) for custom in args.custom]
+    if not scales:
+        scales = [SCALES["small"]]
+
+    from dotmix import __version__
+
+    results: List[Result] = []
+    for scale in scales:
+        print(f"Scale {scale.name}", file=sys.stderr)
+        results += run_scale(scale, args.repeat)
+
+    report = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.time(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    if args.output:
+        with args.output.open("w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        with args.compare.open("r") as f:
+            if compare(results, json.load(f)["results"]):
+                return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
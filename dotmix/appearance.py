@@ -1,15 +1,19 @@
 """Data module for appearances"""
 
-from functools import cache, cached_property
+from functools import cached_property
 from typing import Dict, Optional
 
 from dotmix.config import get_data_dir
 from dotmix.data import (
     BasicData,
     DataFilesDict,
+    ExtendsGraph,
+    ResolvedDataDict,
+    data_cache,
     get_all_data_instances,
     get_data_by_id,
     get_data_files,
+    resolve_all_data,
 )
 
 
@@ -18,7 +22,7 @@ class Appearance(BasicData):
 
     @cached_property
     def parents(self):
-        return self._get_parents(get_appearances, [self])
+        return self._get_parents(get_appearance_by_id, get_appearance_graph())
 
 
 def get_appearances_dir():
@@ -39,6 +43,16 @@ def get_appearance_files() -> DataFilesDict:
     return get_data_files(get_appearances_dir())
 
 
+@data_cache(category="appearances")
+def get_appearance_graph() -> ExtendsGraph:
+    """Get the ``extends`` graph of appearances.
+
+    :returns: Graph of appearance data files
+    """
+
+    return ExtendsGraph(get_appearance_files())
+
+
 def get_appearances() -> Dict[str, Appearance]:
     """Get all appearance instances.
 
@@ -48,7 +62,16 @@ def get_appearances() -> Dict[str, Appearance]:
     return get_all_data_instances(get_appearance_files(), get_appearance_by_id)
 
 
-@cache
+def resolve_appearances() -> ResolvedDataDict:
+    """Compute the data of all appearances.
+
+    :returns: Resolved appearance data by ID
+    """
+
+    return resolve_all_data(get_appearance_graph(), get_appearance_by_id)
+
+
+@data_cache(category="appearances")
 def get_appearance_by_id(id: str) -> Optional[Appearance]:
     """Get a specific appearance instance by id.
 
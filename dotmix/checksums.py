@@ -0,0 +1,298 @@
+"""Module for computing checksums of output files. It contains the functions to hash
+files and to read and write the checksums manifest, which is used to detect
+modifications in the output files without hashing them again"""
+
+import hashlib
+import json
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TypedDict
+
+from dotmix.config import HashAlgorithm, get_data_dir
+from dotmix.utils import write_file_atomic
+
+MANIFEST_VERSION = 2
+"""Version of the manifest format. Manifests with a different version are ignored"""
+
+HASH_ALGORITHMS = ("sha256", "blake2b")
+"""Supported hash algorithms"""
+
+CHUNK_SIZE = 1024 * 1024
+"""Size in bytes of the chunks used to hash files"""
+
+MMAP_THRESHOLD = 16 * 1024 * 1024
+"""Files with at least this size in bytes are memory mapped to hash them"""
+
+
+class ManifestEntry(TypedDict):
+    """Checksum and stat of an output file
+
+    :param size: Size in bytes
+    :param mtime_ns: Modification time in nanoseconds
+    :param ino: Inode number
+    :param hash: Hash of the file content
+    """
+
+    size: int
+    mtime_ns: int
+    ino: int
+    hash: str
+
+
+ManifestFiles = Dict[str, ManifestEntry]
+"""Dictionary of manifest entries by path relative to the output directory"""
+
+
+class Manifest(TypedDict):
+    """Typing for the checksums manifest
+
+    :param version: Version of the manifest format
+    :param algorithm: Name of the hash algorithm of the entries
+    :param written_ns: Modification time of the manifest file in nanoseconds. It's
+        not stored in the file, but taken from its stat when it's read. Files whose
+        modification time is not older than this are always hashed again, because a
+        modification done in the same filesystem timestamp tick wouldn't change their
+        stat
+    :param files: Entries of the output files
+    """
+
+    version: int
+    algorithm: HashAlgorithm
+    written_ns: int
+    files: ManifestFiles
+
+
+def get_checksums_file() -> Path:
+    """Get the checksums files.
+
+    :returns: Checksums file
+    """
+
+    return get_data_dir() / ".checksums"
+
+
+def new_hash(algorithm: HashAlgorithm = "sha256") -> "hashlib._Hash":
+    """Create a hash object
+
+    :param algorithm: Name of the hash algorithm
+    :returns: Hash object
+    """
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"algorithm should be one of {', '.join(HASH_ALGORITHMS)}")
+
+    return hashlib.new(algorithm)
+
+
+def hash_bytes(data: bytes, algorithm: HashAlgorithm = "sha256") -> str:
+    """Create a hash of a bytes object
+
+    :param data: Bytes to hash
+    :param algorithm: Name of the hash algorithm
+    :returns: Generated hash
+    """
+    hash = new_hash(algorithm)
+    hash.update(data)
+    return hash.hexdigest()
+
+
+def hash_file(file: Path, algorithm: HashAlgorithm = "sha256") -> str:
+    """Create a hash of a file
+
+    Files are hashed in chunks (or memory mapped if they are big), so they are never
+    read into memory as a whole.
+
+    :param file: File to hash
+    :param algorithm: Name of the hash algorithm
+
+    :returns: Generated hash
+    """
+    hash = new_hash(algorithm)
+
+    with file.open("rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                hash.update(m)
+        else:
+            buffer = bytearray(CHUNK_SIZE)
+            view = memoryview(buffer)
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                hash.update(view[:read])
+
+    return hash.hexdigest()
+
+
+def hash_files(
+    files: Iterable[Path],
+    algorithm: HashAlgorithm = "sha256",
+    jobs: Optional[int] = None,
+) -> List[str]:
+    """Hash files concurrently in a pool of threads. The hash functions release the
+    GIL while hashing, so files are hashed in parallel.
+
+    :param files: Files to hash
+    :param algorithm: Name of the hash algorithm
+    :param jobs: Number of threads. If it's not set, the number of CPUs is used
+    :returns: Generated hashes in the same order as ``files``
+    """
+    files = list(files)
+    hash = partial(hash_file, algorithm=algorithm)
+
+    if len(files) <= 1 or jobs == 1:
+        return list(map(hash, files))
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(hash, files))
+
+
+def make_entry(stat: os.stat_result, hash: str) -> ManifestEntry:
+    """Create a manifest entry
+
+    :param stat: Stat of the file
+    :param hash: Hash of the file content
+    :returns: Manifest entry
+    """
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "ino": stat.st_ino,
+        "hash": hash,
+    }
+
+
+def walk_files(dir: Path) -> Iterator[Tuple[str, os.stat_result]]:
+    """Recursively get the files of a directory with their stat
+
+    :param dir: Directory to walk
+    :returns: Iterator of relative paths and stats
+    """
+    pending = [dir]
+    while pending:
+        current = pending.pop()
+        try:
+            entries = list(os.scandir(current))
+        except FileNotFoundError:
+            continue
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(Path(entry.path))
+            else:
+                stat = entry.stat()
+                yield os.path.relpath(entry.path, dir), stat
+
+
+def update_manifest(
+    dir: Path, files: ManifestFiles, algorithm: HashAlgorithm = "sha256"
+) -> ManifestFiles:
+    """Update manifest entries with the current files of a directory. Only files
+    whose stat changed are hashed again.
+
+    :param dir: Directory with output files
+    :param files: Manifest entries of the files
+    :param algorithm: Name of the hash algorithm of the entries
+    :returns: Updated manifest entries
+    """
+    updated: ManifestFiles = {}
+    stale: List[Tuple[str, os.stat_result]] = []
+
+    for relative_path, stat in walk_files(dir):
+        entry = files.get(relative_path)
+        if entry is None or make_entry(stat, entry["hash"]) != entry:
+            stale.append((relative_path, stat))
+        else:
+            updated[relative_path] = entry
+
+    hashes = hash_files((dir / p for p, _ in stale), algorithm)
+    for (relative_path, stat), hash in zip(stale, hashes):
+        updated[relative_path] = make_entry(stat, hash)
+
+    return updated
+
+
+def read_manifest() -> Optional[Manifest]:
+    """Read the checksums manifest.
+
+    :returns: Manifest or None if it doesn't exist or it's from a different version
+    """
+    try:
+        with get_checksums_file().open("r") as f:
+            manifest = json.load(f)
+            written_ns = os.fstat(f.fileno()).st_mtime_ns
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None
+
+    manifest["written_ns"] = written_ns
+    return manifest
+
+
+def write_manifest(files: ManifestFiles, algorithm: HashAlgorithm = "sha256") -> None:
+    """Write the checksums manifest atomically.
+
+    :param files: Manifest entries of the output files
+    :param algorithm: Name of the hash algorithm of the entries
+    """
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "algorithm": algorithm,
+        "files": files,
+    }
+
+    write_file_atomic(get_checksums_file(), json.dumps(manifest).encode("utf-8"))
+
+
+def diff_manifest(
+    dir: Path, manifest: Manifest
+) -> Tuple[List[str], List[str], List[str]]:
+    """Compare the files of a directory against a manifest. Only files whose stat
+    changed are hashed.
+
+    :param dir: Directory with output files
+    :param manifest: Manifest of the files
+    :returns: Relative paths of added, modified and removed files
+    """
+    files = manifest["files"]
+    written_ns = manifest["written_ns"]
+    added: List[str] = []
+    modified: List[str] = []
+    stale: List[str] = []
+    seen = set()
+
+    for relative_path, stat in walk_files(dir):
+        seen.add(relative_path)
+        entry = files.get(relative_path)
+
+        if entry is None:
+            added.append(relative_path)
+            continue
+
+        if (
+            stat.st_size == entry["size"]
+            and stat.st_mtime_ns == entry["mtime_ns"]
+            and stat.st_ino == entry["ino"]
+            and stat.st_mtime_ns < written_ns
+        ):
+            continue
+
+        if stat.st_size != entry["size"]:
+            modified.append(relative_path)
+        else:
+            stale.append(relative_path)
+
+    hashes = hash_files((dir / p for p in stale), manifest["algorithm"])
+    for relative_path, hash in zip(stale, hashes):
+        if hash != files[relative_path]["hash"]:
+            modified.append(relative_path)
+
+    removed = [relative_path for relative_path in files if relative_path not in seen]
+
+    return added, modified, removed
@@ -1,11 +1,9 @@
+import signal
+import sys
+from pathlib import Path
+
 import click
 
-from dotmix.appearance import get_appearance_by_id, get_appearances
-from dotmix.colorscheme import get_colorscheme_by_id, get_colorschemes
-from dotmix.config import create_config, get_current_theme, scaffold_data_path
-from dotmix.fileset import get_fileset_by_id, get_filesets
-from dotmix.runner import apply
-from dotmix.typography import get_typographies, get_typography_by_id
 from dotmix.utils import print_err, set_verbose
 
 from .completion import (
@@ -17,6 +15,9 @@ from .completion import (
 )
 from .utils import print_setting_names
 
+# Commands import the modules they need when they run, so the CLI starts fast without
+# loading the data models and the template engine
+
 
 @click.group()
 def cli():
@@ -39,6 +40,8 @@ def config():
 )
 def init(force):
     """Initialize dotmix config and data directory"""
+    from dotmix.config import create_config, scaffold_data_path
+
     if force and click.confirm(
         "Are you sure you want to recreate the default config?", abort=True
     ):
@@ -61,6 +64,8 @@ def fileset():
 @fileset.command("list")
 def fileset_list():
     """Show fileset names and IDs"""
+    from dotmix.fileset import get_filesets
+
     print_setting_names(get_filesets)
 
 
@@ -68,6 +73,8 @@ def fileset_list():
 @click.argument("fileset", type=FilesetType())
 def fileset_show(fileset):
     """List files from fileset"""
+    from dotmix.fileset import get_fileset_by_id
+
     get_fileset_by_id(fileset).print_data()
 
 
@@ -82,6 +89,8 @@ def colorscheme():
 @colorscheme.command("list")
 def colorscheme_list():
     """Show colorscheme names and IDs"""
+    from dotmix.colorscheme import get_colorschemes
+
     print_setting_names(get_colorschemes)
 
 
@@ -89,6 +98,8 @@ def colorscheme_list():
 @click.argument("id", type=ColorschemeType())
 def colorscheme_show(id):
     """Display colors from colorscheme"""
+    from dotmix.colorscheme import get_colorscheme_by_id
+
     get_colorscheme_by_id(id).print_data()
 
 
@@ -103,6 +114,8 @@ def typography():
 @typography.command("list")
 def typography_list():
     """Show typography names and IDs"""
+    from dotmix.typography import get_typographies
+
     print_setting_names(get_typographies)
 
 
@@ -110,6 +123,8 @@ def typography_list():
 @click.argument("id", type=TypographyType())
 def typography_show(id):
     """Display variables from typography"""
+    from dotmix.typography import get_typography_by_id
+
     get_typography_by_id(id).print_data()
 
 
@@ -124,6 +139,8 @@ def appearance():
 @appearance.command("list")
 def appearance_list():
     """Show appearances names and IDs"""
+    from dotmix.appearance import get_appearances
+
     print_setting_names(get_appearances)
 
 
@@ -131,6 +148,8 @@ def appearance_list():
 @click.argument("id", type=AppearanceType())
 def appearance_show(id):
     """Display variables from appearance"""
+    from dotmix.appearance import get_appearance_by_id
+
     get_appearance_by_id(id).print_data()
 
 
@@ -156,6 +175,34 @@ def appearance_show(id):
 @click.option(
     "--reapply", "-r", is_flag=True, help="Run with last applied theme/settings"
 )
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    help="Number of workers used to render files",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(["thread", "process"]),
+    help="Executor backend used to render files",
+)
+@click.option(
+    "--incremental/--full",
+    "-i/-I",
+    default=None,
+    help="Only render files whose template or variables changed",
+)
+@click.option(
+    "--output-mode",
+    type=click.Choice(["swap", "update"]),
+    help="Replace the output directory or only write changed files in it",
+)
+@click.option("--profile", is_flag=True, help="Print the time spent in every phase")
+@click.option(
+    "--profile-output",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="Write the time spent in every phase and file to a JSON file",
+)
 def cli_apply(
     fileset,
     typography,
@@ -167,8 +214,17 @@ def cli_apply(
     force,
     verbose,
     reapply,
+    jobs,
+    backend,
+    incremental,
+    output_mode,
+    profile,
+    profile_output,
 ):
     """Generate output files from fileset and data"""
+    from dotmix.config import get_current_theme
+    from dotmix.profiling import Profiler
+    from dotmix.runner import apply
 
     if verbose:
         set_verbose(True)
@@ -189,6 +245,8 @@ def cli_apply(
         pre = current_dict.get("pre_hook") or pre
         post = current_dict.get("post_hook") or post
 
+    profiler = Profiler() if profile or profile_output else None
+
     apply(
         fileset_id=fileset,
         typography_id=typography,
@@ -199,4 +257,92 @@ def cli_apply(
         use_defaults=not no_defaults,
         force=force,
         interactive=True,
+        jobs=jobs,
+        backend=backend,
+        incremental=incremental,
+        output_mode=output_mode,
+        profiler=profiler,
     )
+
+    if profile:
+        click.echo("")
+        profiler.print_table()
+    if profile_output:
+        profiler.write_json(profile_output)
+
+
+@cli.command("watch")
+@click.option("--fileset", "-f", type=FilesetType())
+@click.option("--typography", "-t", type=TypographyType())
+@click.option("--appearance", "-a", type=AppearanceType())
+@click.option("--colorscheme", "-c", type=ColorschemeType())
+@click.option("--pre", type=HookType(), help="Pre hook ID")
+@click.option("--post", type=HookType(), help="Post hook ID")
+@click.option(
+    "--no-defaults",
+    "-N",
+    is_flag=True,
+    help="Disable default data from configuration",
+    default=False,
+)
+@click.option("--force", "-F", is_flag=True, help="Run even if files changed")
+@click.option("--verbose", "-v", is_flag=True, help="Print additional information")
+@click.option("--poll", is_flag=True, help="Poll data files instead of using inotify")
+@click.option(
+    "--debounce",
+    type=click.IntRange(min=0),
+    default=50,
+    show_default=True,
+    help="Milliseconds without changes to wait before rendering",
+)
+def cli_watch(
+    fileset,
+    typography,
+    appearance,
+    colorscheme,
+    pre,
+    post,
+    no_defaults,
+    force,
+    verbose,
+    poll,
+    debounce,
+):
+    """Generate output files every time data files change"""
+    from dotmix.watch import watch
+
+    if verbose:
+        set_verbose(True)
+
+    try:
+        watch(
+            fileset_id=fileset,
+            typography_id=typography,
+            appearance_id=appearance,
+            colorscheme_id=colorscheme,
+            pre_hook=pre,
+            post_hook=post,
+            use_defaults=not no_defaults,
+            force=force,
+            poll=poll,
+            debounce=debounce / 1000,
+        )
+    except KeyboardInterrupt:
+        click.echo("\nStopped watching")
+
+
+@cli.command("server")
+@click.option("--verbose", "-v", is_flag=True, help="Print additional information")
+def cli_server(verbose):
+    """Run a server that keeps data loaded in memory for dotmixc"""
+    from dotmix.server import Server
+
+    if verbose:
+        set_verbose(True)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    try:
+        Server().serve()
+    except KeyboardInterrupt:
+        click.echo("\nStopped server")
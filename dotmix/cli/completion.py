@@ -1,55 +1,201 @@
+"""Parameter types for data IDs with shell completion.
+
+IDs are completed from a small index per category, with the ID, name and mtime of
+every data file. Indexes are stored in the data directory and they are only updated
+when the mtime of the category directory changes. Data files are only read again
+if their mtime changed, and data classes are never loaded, so completion is fast
+even for categories with thousands of files.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, Literal, Optional, Tuple, TypedDict
+
 from click import ParamType
 from click.shell_completion import CompletionItem
 
-from dotmix.appearance import get_appearances
-from dotmix.colorscheme import get_colorschemes
-from dotmix.fileset import get_filesets
-from dotmix.runner import get_hooks
-from dotmix.typography import get_typographies
+from dotmix.utils import (
+    get_data_dir,
+    get_toml_parser,
+    read_toml_header,
+    write_file_atomic,
+)
 
+COMPLETION_INDEX_VERSION = 1
+"""Version of the completion index format. Indexes with a different version are
+rebuilt"""
 
-class IdType(ParamType):
-    name = "ID"
+IndexCategory = Literal["colorschemes", "typographies", "appearances", "filesets"]
+"""Data directories with a completion index"""
 
 
-class AppearanceType(IdType):
-    def shell_complete(self, ctx, param, incomplete):
-        appearances = get_appearances()
+class IndexEntry(TypedDict):
+    """Typing for the entries of the completion index
 
-        ids = [c.id for c in appearances.values()]
+    :param name: Name of the data file
+    :param mtime_ns: Modification time of the data file in nanoseconds
+    """
 
-        return [CompletionItem(name) for name in ids if name.startswith(incomplete)]
+    name: str
+    mtime_ns: int
 
 
-class ColorschemeType(IdType):
-    def shell_complete(self, ctx, param, incomplete):
-        colorschemes = get_colorschemes()
+class CompletionIndex(TypedDict):
+    """Typing for the completion index of a category
 
-        ids = [c.id for c in colorschemes.values()]
+    :param version: Version of the index format
+    :param mtime_ns: Modification time of the category directory in nanoseconds
+    :param entries: Entries by ID
+    """
 
-        return [CompletionItem(name) for name in ids if name.startswith(incomplete)]
+    version: int
+    mtime_ns: int
+    entries: Dict[str, IndexEntry]
 
 
-class FilesetType(IdType):
-    def shell_complete(self, ctx, param, incomplete):
-        filesets = get_filesets()
+def get_completion_index_file(category: IndexCategory) -> Path:
+    """Get the completion index file of a category
+
+    :param category: Name of the category directory
+    :returns: Completion index file
+    """
+    return get_data_dir() / ".cache" / "completion" / f"{category}.json"
+
+
+def _read_index(file: Path) -> Optional[CompletionIndex]:
+    try:
+        with file.open("r") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(index, dict) or index.get("version") != COMPLETION_INDEX_VERSION:
+        return None
+
+    return index
+
+
+def _read_name(path: Path) -> Optional[str]:
+    # Completion must not print errors, so the file is parsed without
+    # load_toml_header (which prints them) and skipped if it's invalid
+    parser = get_toml_parser()
+
+    try:
+        try:
+            cfg = parser.loads(read_toml_header(path))
+        except parser.error:
+            # The header can't be parsed on its own
+            cfg = parser.loads(path.read_text())
+    except (OSError, ValueError, parser.error):
+        return None
+
+    name = cfg.get("name") if cfg else None
+    return name if name and isinstance(name, str) else None
+
+
+def _scan_category(
+    category: IndexCategory, dir: Path
+) -> Iterator[Tuple[str, Path, int]]:
+    with os.scandir(dir) as entries:
+        for entry in entries:
+            if category == "filesets":
+                path = Path(entry.path) / "settings.toml"
+                try:
+                    mtime_ns = path.stat().st_mtime_ns
+                except OSError:
+                    continue
+
+                yield entry.name, path, mtime_ns
 
-        ids = [c.id for c in filesets.values()]
+            elif entry.name.endswith(".toml") and entry.is_file():
+                id = entry.name[: -len(".toml")]
+                yield id, Path(entry.path), entry.stat().st_mtime_ns
 
-        return [CompletionItem(name) for name in ids if name.startswith(incomplete)]
 
+def get_completion_index(category: IndexCategory) -> Dict[str, IndexEntry]:
+    """Get the IDs and names of the data files of a category. The stored index is
+    updated if the mtime of the category directory changed.
+
+    :param category: Name of the category directory
+    :returns: Index entries by ID
+    """
+    dir = get_data_dir() / category
+    try:
+        mtime_ns = dir.stat().st_mtime_ns
+    except OSError:
+        return {}
+
+    index_file = get_completion_index_file(category)
+    index = _read_index(index_file)
+    if index and index["mtime_ns"] == mtime_ns:
+        return index["entries"]
+
+    previous = index["entries"] if index else {}
+    entries: Dict[str, IndexEntry] = {}
+
+    for id, path, file_mtime_ns in _scan_category(category, dir):
+        entry = previous.get(id)
+        if not entry or entry["mtime_ns"] != file_mtime_ns:
+            name = _read_name(path)
+            if not name:
+                continue
+            entry = {"name": name, "mtime_ns": file_mtime_ns}
+
+        entries[id] = entry
+
+    index = {
+        "version": COMPLETION_INDEX_VERSION,
+        "mtime_ns": mtime_ns,
+        "entries": entries,
+    }
+    try:
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        write_file_atomic(index_file, json.dumps(index).encode("utf-8"))
+    except OSError:
+        pass
+
+    return entries
+
+
+class IdType(ParamType):
+    name = "ID"
+
+
+class IndexedIdType(IdType):
+    category: IndexCategory
 
-class TypographyType(IdType):
     def shell_complete(self, ctx, param, incomplete):
-        typographies = get_typographies()
+        entries = get_completion_index(self.category)
+
+        return [
+            CompletionItem(id, help=entry["name"])
+            for id, entry in sorted(entries.items())
+            if id.startswith(incomplete)
+        ]
+
+
+class AppearanceType(IndexedIdType):
+    category = "appearances"
+
+
+class ColorschemeType(IndexedIdType):
+    category = "colorschemes"
+
+
+class FilesetType(IndexedIdType):
+    category = "filesets"
 
-        ids = [c.id for c in typographies.values()]
 
-        return [CompletionItem(name) for name in ids if name.startswith(incomplete)]
+class TypographyType(IndexedIdType):
+    category = "typographies"
 
 
 class HookType(IdType):
     def shell_complete(self, ctx, param, incomplete):
-        hooks = get_hooks()
+        try:
+            hooks = sorted(os.listdir(get_data_dir() / "hooks"))
+        except OSError:
+            hooks = []
 
         return [CompletionItem(name) for name in hooks if name.startswith(incomplete)]
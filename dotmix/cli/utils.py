@@ -1,11 +1,12 @@
-from typing import Callable, Dict
+from typing import TYPE_CHECKING, Callable, Dict
 
 import click
 
-from dotmix.data import DataClassType
+if TYPE_CHECKING:
+    from dotmix.data import DataClassType
 
 
-def print_setting_names(func: Callable[[], Dict[str, DataClassType]]):
+def print_setting_names(func: Callable[[], Dict[str, "DataClassType"]]):
     click.echo("Name (ID)")
     for settings in func().values():
         click.secho(f"{settings.name} ({settings.id})", fg="blue", bold=True)
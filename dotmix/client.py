@@ -0,0 +1,174 @@
+"""Minimal client for the dotmix server.
+
+The client sends its arguments, environment, working directory and standard streams
+to a running server (see :mod:`dotmix.server`), which runs the command. If no server
+is running, the command runs in the current process.
+
+This module only imports the standard library, so it starts faster than the full
+CLI.
+"""
+
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+from typing import List, Optional
+
+SOCKET_ENV = "DOTMIX_SOCKET"
+"""Environment variable to override the server socket path"""
+
+
+def get_fallback_socket_dir() -> str:
+    """Get the directory of the server socket when ``$XDG_RUNTIME_DIR`` is not set.
+    It's a per user directory in ``/tmp``, which must be private (see
+    :func:`is_private_dir`).
+
+    :returns: Socket directory
+    """
+    return os.path.join("/tmp", f"dotmix-{os.getuid()}")
+
+
+def is_private_dir(path: str) -> bool:
+    """Check that a directory is owned by the current user and that other users
+    can't access it. Symbolic links are not followed.
+
+    :param path: Directory path
+    :returns: True if the directory is private
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+
+    return (
+        stat.S_ISDIR(st.st_mode)
+        and st.st_uid == os.getuid()
+        and stat.S_IMODE(st.st_mode) & 0o077 == 0
+    )
+
+
+def get_socket_path() -> str:
+    """Get the path of the server socket.
+
+    By default, the socket is ``$XDG_RUNTIME_DIR/dotmix.sock`` (or ``dotmix.sock`` in
+    the directory returned by :func:`get_fallback_socket_dir`), but it can be
+    modified by setting the environment variable ``$DOTMIX_SOCKET``.
+
+    :returns: Socket path
+    """
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "dotmix.sock")
+
+    return os.path.join(get_fallback_socket_dir(), "dotmix.sock")
+
+
+def get_peer_uid(sock: socket.socket) -> Optional[int]:
+    """Get the user id of the process on the other end of a unix socket
+
+    :param sock: Connected unix socket
+    :returns: User id of the peer or None if the platform doesn't support
+        ``SO_PEERCRED``
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+
+    creds = sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    _, uid, _ = struct.unpack("3i", creds)
+    return uid
+
+
+def is_same_user(sock: socket.socket) -> bool:
+    """Check that the process on the other end of a unix socket runs as the current
+    user. On platforms without ``SO_PEERCRED``, only the permissions of the socket
+    protect it.
+
+    :param sock: Connected unix socket
+    :returns: True if the peer runs as the current user
+    """
+    uid = get_peer_uid(sock)
+    return uid is None or uid == os.getuid()
+
+
+def connect(path: Optional[str] = None) -> Optional[socket.socket]:
+    """Connect to the server. The environment and standard streams of the client are
+    sent to the server, so servers run by other users are refused.
+
+    :param path: Socket path. If it's not set, :func:`get_socket_path` is used
+    :returns: Connected socket or None if the server is not running
+    """
+    path = path or get_socket_path()
+    if os.path.dirname(path) == get_fallback_socket_dir() and not is_private_dir(
+        os.path.dirname(path)
+    ):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+
+    if not is_same_user(sock):
+        sock.close()
+        print(
+            f"Warning: Ignoring the dotmix server on {path}, it's run by another user",
+            file=sys.stderr,
+        )
+        return None
+
+    return sock
+
+
+def run(sock: socket.socket, args: List[str]) -> int:
+    """Run a command in the server. The standard streams of this process are sent
+    to the server, so the command reads and writes them directly.
+
+    :param sock: Socket returned by :func:`connect`
+    :param args: Command line arguments (without the program name)
+    :returns: Exit code of the command
+    """
+    request = {
+        "args": args,
+        "prog_name": os.path.basename(sys.argv[0]),
+        "env": dict(os.environ),
+        "cwd": os.getcwd(),
+    }
+
+    socket.send_fds(sock, [b"\0"], [0, 1, 2])
+    with sock.makefile("rwb") as f:
+        f.write(json.dumps(request).encode("utf-8") + b"\n")
+        f.flush()
+        response = f.readline()
+
+    if not response:
+        print("Error: The connection with the dotmix server was lost", file=sys.stderr)
+        return 1
+
+    return json.loads(response)["code"]
+
+
+def main() -> None:
+    """Entry point of the client"""
+    sock = connect()
+    if not sock:
+        from dotmix.cli import cli
+
+        cli()
+        return
+
+    with sock:
+        sys.exit(run(sock, sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,39 @@
 """Data module for colorschemes"""
 import os
-from functools import cache, cached_property
+from functools import cached_property
 from pathlib import Path
 from typing import Any, Dict, Literal, Optional, TypedDict, cast
 
 import click
 
 from dotmix.colorutils import (
+    ALT_COLORS,
     Base16Colorscheme,
     DotmixColorscheme,
     ParsedColorschemes,
     TerminalColorscheme,
-    make_alt_color,
-    make_average_color,
-    make_brown_from_orange,
-    make_orange_from_yellow,
-    normalize,
+    alt_color,
+    average,
+    darken,
+    format_hex,
+    parse_colors,
+    rotate,
 )
 from dotmix.config import get_config, get_data_dir
 from dotmix.data import (
     AbstractData,
     DataFileModel,
     DataFilesDict,
+    ExtendsGraph,
+    ResolvedDataDict,
+    data_cache,
     get_all_data_instances,
     get_data_by_id,
     get_data_files,
+    resolve_all_data,
 )
-from dotmix.utils import deep_merge, load_toml_cfg_model, print_key_values
+from dotmix.datacache import load_data_cfg_model
+from dotmix.utils import deep_merge, print_key_values
 from dotmix.vendor.colp import HEX
 
 
@@ -47,31 +54,38 @@ class Colorscheme(AbstractData[ColorschemeDataFileModel, ColorschemeData]):
     """Data class for appearances"""
 
     def load_data_file(self):
-        self.file_data = load_toml_cfg_model(
+        self.file_data = load_data_cfg_model(
             self.data_file_path, ColorschemeDataFileModel
         )
 
     def compute_data(self):
-        if not self.file_data.extends:
-            self.data: ColorschemeData = {
-                "colors": compute_colors(self.file_data.colors),
-                "custom": self.file_data.custom or {},
-            }
-
-        colors_dict = {}
-        custom_dict = {}
-        for colorscheme in reversed(self.parents):
-            colors_dict = deep_merge(colors_dict, colorscheme.file_data.colors.dict())
-            custom_dict = deep_merge(custom_dict, colorscheme.file_data.custom)
-
-        self.data = {
-            "colors": compute_colors(ParsedColorschemes.parse_obj(colors_dict)),
-            "custom": custom_dict,
+        if not self.parent:
+            colors = self.file_data.colors
+        else:
+            colors = ParsedColorschemes.parse_obj(self.merged_colors)
+
+        self.data: ColorschemeData = {
+            "colors": compute_colors(colors),
+            "custom": self.merged_custom,
         }
 
+    @cached_property
+    def merged_colors(self) -> Dict[str, Any]:
+        """Parsed colors of this instance merged with the colors of its parents. Like
+        :attr:`dotmix.data.AbstractData.merged_custom`, it's merged with the merged
+        colors of the closest parent
+
+        :returns: Dictionary of :class:`dotmix.colorutils.ParsedColorschemes`
+        """
+        colors = self.file_data.colors.dict()
+        if not self.parent:
+            return colors
+
+        return deep_merge(self.parent.merged_colors, colors)
+
     @cached_property
     def parents(self):
-        return self._get_parents(get_colorschemes, [self])
+        return self._get_parents(get_colorscheme_by_id, get_colorscheme_graph())
 
     def print_data(self):
         colors = self.data["colors"]
@@ -120,6 +134,16 @@ def get_colorscheme_files() -> DataFilesDict:
     return get_data_files(get_colorschemes_dir())
 
 
+@data_cache(category="colorschemes")
+def get_colorscheme_graph() -> ExtendsGraph:
+    """Get the ``extends`` graph of colorschemes.
+
+    :returns: Graph of colorscheme data files
+    """
+
+    return ExtendsGraph(get_colorscheme_files())
+
+
 def get_colorschemes() -> Dict[str, Colorscheme]:
     """Get all colorscheme instances.
 
@@ -129,7 +153,16 @@ def get_colorschemes() -> Dict[str, Colorscheme]:
     return get_all_data_instances(get_colorscheme_files(), get_colorscheme_by_id)
 
 
-@cache
+def resolve_colorschemes() -> ResolvedDataDict:
+    """Compute the data of all colorschemes.
+
+    :returns: Resolved colorscheme data by ID
+    """
+
+    return resolve_all_data(get_colorscheme_graph(), get_colorscheme_by_id)
+
+
+@data_cache(category="colorschemes")
 def get_colorscheme_by_id(id: str) -> Optional[Colorscheme]:
     """Get a specific colorscheme instance by id.
 
@@ -197,16 +230,12 @@ def compute_colorscheme_from_base16(
         "brown": c.base0F,
     }
 
-    color_dict = {k: normalize(v) for k, v in color_dict.items()}
+    # Colors are parsed once, and derived colors are computed from parsed colors
+    parsed = parse_colors(color_dict)
+    color_dict = {k: format_hex(v) for k, v in parsed.items()}
 
-    color_dict["alt_red"] = make_alt_color(c.base08)
-    color_dict["alt_orange"] = make_alt_color(c.base09)
-    color_dict["alt_yellow"] = make_alt_color(c.base0A)
-    color_dict["alt_green"] = make_alt_color(c.base0B)
-    color_dict["alt_cyan"] = make_alt_color(c.base0C)
-    color_dict["alt_blue"] = make_alt_color(c.base0D)
-    color_dict["alt_magenta"] = make_alt_color(c.base0E)
-    color_dict["alt_brown"] = make_alt_color(c.base0F)
+    for name in ALT_COLORS:
+        color_dict[f"alt_{name}"] = format_hex(alt_color(parsed[name]))
 
     return DotmixColorscheme.parse_obj(color_dict)
 
@@ -243,15 +272,14 @@ def compute_colorscheme_from_terminal(
         "alt_cyan": c.color14,
     }
 
-    color_dict = {k: normalize(v) for k, v in color_dict.items()}
+    # Colors are parsed once, and derived colors are computed from parsed colors
+    parsed = parse_colors(color_dict)
 
-    color_dict["orange"] = make_orange_from_yellow(color_dict["yellow"])
-    color_dict["brown"] = make_brown_from_orange(color_dict["orange"])
-    color_dict["alt_orange"] = make_alt_color(color_dict["orange"])
-    color_dict["alt_brown"] = make_alt_color(color_dict["brown"])
-    color_dict["selection"] = make_average_color(
-        color_dict["light_bg"], color_dict["comment"]
-    )
-    color_dict["lighter_fg"] = make_alt_color(color_dict["light_fg"], inverse=True)
+    parsed["orange"] = rotate(parsed["yellow"], -15)
+    parsed["brown"] = darken(rotate(parsed["orange"], -10), 1.1)
+    parsed["alt_orange"] = alt_color(parsed["orange"])
+    parsed["alt_brown"] = alt_color(parsed["brown"])
+    parsed["selection"] = average(parsed["light_bg"], parsed["comment"])
+    parsed["lighter_fg"] = alt_color(parsed["light_fg"], inverse=True)
 
-    return DotmixColorscheme.parse_obj(color_dict)
+    return DotmixColorscheme.parse_obj({k: format_hex(v) for k, v in parsed.items()})
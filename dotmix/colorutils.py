@@ -1,12 +1,16 @@
 """This module contains the utilitary models and functions needed by
 :mod:`dotmix.colorscheme` """
 
-from typing import Any, Callable, Optional, TypeVar, cast
+import colorsys
+from functools import lru_cache, wraps
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple, TypeVar, cast
 
 from pydantic import BaseModel
 
 from dotmix.utils import print_err
-from dotmix.vendor.colp import HEX, RGB
+
+if TYPE_CHECKING:
+    from functools import _CacheInfo, _lru_cache_wrapper
 
 
 class Base16Colorscheme(BaseModel):
@@ -156,6 +160,42 @@ HexSafeFunction = TypeVar(
 """Type for functions that take hexadecimal color codes as inputs"""
 
 
+COLOR_CACHE_SIZE = 4096
+"""Maximum number of results stored by the cache of every color function"""
+
+_color_caches: Dict[str, "_lru_cache_wrapper"] = {}
+
+
+def color_cache(func: HexSafeFunction) -> HexSafeFunction:
+    """Decorator to memoize a color function in a bounded LRU cache.
+
+    Color functions only depend on their arguments, so colors shared by several
+    colorschemes (for instance, colorschemes that extend the same one) are only
+    computed once. When it decorates a function decorated with :func:`check_hex`,
+    colors are validated once per distinct argument.
+
+    :param func: Color function
+    """
+    cached = lru_cache(maxsize=COLOR_CACHE_SIZE)(func)
+    _color_caches[func.__name__] = cached
+
+    return cast(HexSafeFunction, cached)
+
+
+def get_color_cache_info() -> Dict[str, "_CacheInfo"]:
+    """Get the hits and misses of the cache of every color function
+
+    :returns: Cache info by function name
+    """
+    return {name: cached.cache_info() for name, cached in _color_caches.items()}
+
+
+def clear_color_caches() -> None:
+    """Clear the cache of every color function"""
+    for cached in _color_caches.values():
+        cached.cache_clear()
+
+
 def check_hex(func: HexSafeFunction) -> HexSafeFunction:
     """Decorator to check if the colors passed to a function are valid hexadecimal
     codes.
@@ -163,6 +203,7 @@ def check_hex(func: HexSafeFunction) -> HexSafeFunction:
     :param func: The function to be called if the value is valid
     """
 
+    @wraps(func)
     def inner(*args: str, **kwargs):
         for arg in args:
             try:
@@ -172,7 +213,7 @@ def check_hex(func: HexSafeFunction) -> HexSafeFunction:
                 print_err(f"Called {f} with empty color", True)
 
             try:
-                HEX(arg)
+                parse_hex(arg)
             except ValueError:
                 print_err(f"{arg} is not a valid hex color string", True)
 
@@ -181,6 +222,191 @@ def check_hex(func: HexSafeFunction) -> HexSafeFunction:
     return cast(HexSafeFunction, inner)
 
 
+HexColor = Tuple[float, float, float, float]
+"""Red, green, blue and alpha channels of a parsed hexadecimal color, from 0 to 1"""
+
+
+@color_cache
+def parse_hex(color: str) -> HexColor:
+    """Parse a hexadecimal color code. This parses colors exactly like ``colp.HEX``, so
+    it accepts the same codes (with or without ``#``, with 3, 6 or 8 digits).
+
+    :param color: Hexadecimal color code
+    :returns: Parsed color
+    :raises ValueError: If the color is not a valid hexadecimal code
+    """
+    if color[0] == "#":
+        color = color[1:]
+
+    ws = int(len(color) == 3) + 1
+    return (
+        int(color[0 // ws : 2 // ws] * ws, 16) / 255,
+        int(color[2 // ws : 4 // ws] * ws, 16) / 255,
+        int(color[4 // ws : 6 // ws] * ws, 16) / 255,
+        int(color[6 // ws : 8 // ws] * ws, 16) / 255 if len(color) > 6 else 0,
+    )
+
+
+# The following functions transform parsed colors with the same floating point
+# operations that colp does through its RGB, HSV and HEX objects (including its
+# quirks, like treating channels above 1 as 0-255 values), so results are identical
+# to the ones of colp without creating any objects. Like colp, colors with an alpha
+# channel can't be transformed.
+
+
+def _check_alpha(color: HexColor) -> None:
+    if color[3]:
+        raise TypeError("colors with an alpha channel are not supported")
+
+
+def _rgb(r: float, g: float, b: float) -> HexColor:
+    # colp.RGB takes float channels as values from 0 to 255 (modulo 256) if any of
+    # them is not between 0 and 1
+    if r > 1 or g > 1 or b > 1 or r < 0 or g < 0 or b < 0:
+        r, g, b = (r % 256) / 255, (g % 256) / 255, (b % 256) / 255
+
+    return (r, g, b, 0)
+
+
+def _quantize(color: HexColor) -> HexColor:
+    # Conversion to colp.HEX, which rounds channels down to 8 bits
+    return _rgb(
+        int(255 * color[0]) / 255, int(255 * color[1]) / 255, int(255 * color[2]) / 255
+    )
+
+
+def format_hex(color: HexColor) -> str:
+    """Format a parsed color as a hexadecimal code
+
+    :param color: Parsed color
+    :returns: Color heaxedecimal normalized in the form of "#000FFF"
+    """
+    _check_alpha(color)
+    return "#%02x%02x%02x" % (
+        int(255 * color[0]),
+        int(255 * color[1]),
+        int(255 * color[2]),
+    )
+
+
+def brightness(color: HexColor) -> float:
+    """Get the brightness of a color, which is its greatest channel
+
+    :param color: Parsed color
+    :returns: Brightness from 0 to 1
+    """
+    return max(color)
+
+
+@color_cache
+def darken(color: HexColor, factor: float) -> HexColor:
+    """Make a color darker, like ``colp.HEX.darker``
+
+    :param color: Parsed color
+    :param factor: Darkening factor. Values lower than 1 make the color lighter
+    :returns: Darker color
+    """
+    _check_alpha(color)
+    k = 1 / factor
+    r, g, b, _ = _rgb(color[0] * k, color[1] * k, color[2] * k)
+
+    # colp takes the channels modulo 256 as integers, so they are already rounded
+    # down to 8 bits
+    return (
+        int(255 * r) % 256 / 255,
+        int(255 * g) % 256 / 255,
+        int(255 * b) % 256 / 255,
+        0,
+    )
+
+
+@color_cache
+def rotate(color: HexColor, angle: int) -> HexColor:
+    """Rotate the hue of a color, like ``colp.HEX.rotate``
+
+    :param color: Parsed color
+    :param angle: Angle in degrees
+    :returns: Rotated color
+    """
+    _check_alpha(color)
+    h, s, v = colorsys.rgb_to_hsv(color[0], color[1], color[2])
+    h = (int(h * 360) + angle) % 360 / 360
+    s = int(s * 100) / 100
+    v = int(v * 100) / 100
+
+    return _quantize(_rgb(*colorsys.hsv_to_rgb(h, s, v * 255)))
+
+
+@color_cache
+def average(color1: HexColor, color2: HexColor) -> HexColor:
+    """Get the average of two colors. The alpha channel is ignored
+
+    :param color1: First parsed color
+    :param color2: Second parsed color
+    :returns: Average color
+    """
+    return _quantize(
+        _rgb(
+            (color1[0] + color2[0]) / 2,
+            (color1[1] + color2[1]) / 2,
+            (color1[2] + color2[2]) / 2,
+        )
+    )
+
+
+@color_cache
+def alt_color(color: HexColor, inverse: bool = False) -> HexColor:
+    """Make a darker color of a lighter one or a lighter one of a darker one
+
+    :param color: Parsed color
+    :param inverse: Invert how this function works
+    :returns: Alternative color
+    """
+    if (brightness(color) > 0.5) != inverse:
+        return darken(color, 1.25)
+
+    return darken(color, 0.75)
+
+
+ALT_COLORS = [
+    "red",
+    "orange",
+    "yellow",
+    "green",
+    "cyan",
+    "blue",
+    "magenta",
+    "brown",
+]
+"""Colors that have an alternative color in :class:`DotmixColorscheme`"""
+
+
+def parse_colors(colors: Dict[str, Optional[str]]) -> Dict[str, HexColor]:
+    """Validate and parse the colors of a palette. Every color is parsed once, and
+    this exits with the same errors as the functions decorated with
+    :func:`check_hex` if a color is empty or invalid.
+
+    Parsed colors are exact (their channels are multiples of 1/255), so they can be
+    transformed without normalizing them first.
+
+    :param colors: Dict of hexadecimal color codes
+    :returns: Dict of parsed colors
+    """
+    parsed: Dict[str, HexColor] = {}
+
+    for name, color in colors.items():
+        if not color:
+            print_err("Called normalize with empty color", True)
+
+        try:
+            parsed[name] = parse_hex(cast(str, color))
+        except ValueError:
+            print_err(f"{color} is not a valid hex color string", True)
+
+    return parsed
+
+
+@color_cache
 @check_hex
 def normalize(color: Optional[str]) -> str:
     """Convert ``colp.HEX`` to ``str``.
@@ -190,9 +416,10 @@ def normalize(color: Optional[str]) -> str:
     :param colors: List of colors (only the first is used)
     :returns: Color heaxedecimal normalized in the form of "#000FFF"
     """
-    return str(HEX(color))
+    return format_hex(parse_hex(cast(str, color)))
 
 
+@color_cache
 @check_hex
 def make_alt_color(color: Optional[str], inverse: bool = False) -> str:
     """Make a darker color of a lighter one or a lighter one of a darker one
@@ -201,13 +428,10 @@ def make_alt_color(color: Optional[str], inverse: bool = False) -> str:
     :param inverse: Invert how this function works
     :returns: Color heaxedecimal normalized in the form of "#000FFF"
     """
-    c = HEX(color)
-    if not inverse:
-        return str(c.darker(1.25) if c.brightness() > 0.5 else c.darker(0.75))
-    else:
-        return str(c.darker(0.75) if c.brightness() > 0.5 else c.darker(1.25))
+    return format_hex(alt_color(parse_hex(cast(str, color)), inverse))
 
 
+@color_cache
 @check_hex
 def make_orange_from_yellow(color: Optional[str]) -> str:
     """Make a "orange" color from a "yellow" one
@@ -215,10 +439,10 @@ def make_orange_from_yellow(color: Optional[str]) -> str:
     :param color: Yellow color
     :returns: Color heaxedecimal normalized in the form of "#000FFF"
     """
-    c = HEX(color)
-    return str(c.rotate(-15))
+    return format_hex(rotate(parse_hex(cast(str, color)), -15))
 
 
+@color_cache
 @check_hex
 def make_brown_from_orange(color: Optional[str]) -> str:
     """Make a "brown" color from a "orange" one
@@ -226,10 +450,10 @@ def make_brown_from_orange(color: Optional[str]) -> str:
     :param color: Orange color
     :returns: Color heaxedecimal normalized in the form of "#000FFF"
     """
-    c = HEX(color)
-    return str(c.rotate(-10).darker(1.1))
+    return format_hex(darken(rotate(parse_hex(cast(str, color)), -10), 1.1))
 
 
+@color_cache
 @check_hex
 def make_average_color(color1: Optional[str], color2: Optional[str]) -> str:
     """Get the average color of two colors
@@ -238,12 +462,6 @@ def make_average_color(color1: Optional[str], color2: Optional[str]) -> str:
     :param color2: Second color
     :returns: Color heaxedecimal normalized in the form of "#000FFF"
     """
-    try:
-        a = HEX(color1)
-        b = HEX(color2)
-    except IndexError:
-        print_err("make_average_color requires a list of two items", True)
-
-    return str(
-        RGB((a.r + b.r) / 2, (a.g + b.g) / 2, (a.b + b.b) / 2).to(HEX)  # type: ignore
+    return format_hex(
+        average(parse_hex(cast(str, color1)), parse_hex(cast(str, color2)))
     )
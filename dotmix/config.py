@@ -1,14 +1,21 @@
 """Module for reading and writing the configuration"""
 
 
+import os
 import sys
 from pathlib import Path
-from typing import Literal, Optional
+from typing import Dict, Literal, Optional, Tuple
 
 import toml
 from pydantic import BaseModel
 
-from dotmix.utils import get_path_from_env, load_toml_cfg_model, print_err
+from dotmix.utils import (
+    get_config_dir,
+    get_data_dir,
+    load_toml_cfg_model,
+    print_err,
+    write_file_atomic,
+)
 
 # Types:
 
@@ -17,6 +24,18 @@ ThemeKeys = Literal[
 ]
 """Possible keys for ``dotmix.config.ThemeConfig``"""
 
+RenderBackend = Literal["thread", "process"]
+"""Possible executor backends for rendering filesets concurrently"""
+
+OutputMode = Literal["swap", "update"]
+"""Possible ways of replacing output files"""
+
+HashAlgorithm = Literal["sha256", "blake2b"]
+"""Possible hash algorithms for the checksums of output files"""
+
+ConfigStat = Tuple[int, int, int]
+"""Modification time, size and inode of the configuration file"""
+
 
 # Models:
 
@@ -65,6 +84,38 @@ class ColorsConfig(BaseModel):
     colormode: Literal["terminal", "base16"]
 
 
+class RenderConfig(BaseModel):
+    """Render configuration
+
+    :param jobs: Number of workers used to render files. If it's not set, the number
+        of CPUs is used
+    :param backend: Executor backend used by the workers ("thread" or "process")
+    :param cache_size: Maximum size in bytes of the parsed templates cache
+    :param incremental: Only render files whose template or variables changed since
+        the last run
+    :param output_mode: How output files are replaced ("swap" to replace the output
+        directory or "update" to only write the files that changed in it)
+
+    """
+
+    jobs: Optional[int]
+    backend: RenderBackend = "thread"
+    cache_size: int = 64 * 1024 * 1024
+    incremental: bool = False
+    output_mode: OutputMode = "swap"
+
+
+class ChecksumsConfig(BaseModel):
+    """Checksums configuration
+
+    :param algorithm: Hash algorithm for the checksums of output files ("sha256" or
+        "blake2b")
+
+    """
+
+    algorithm: HashAlgorithm = "sha256"
+
+
 class Config(BaseModel):
     """Root config model. This only holds other models for organizative purposes"""
 
@@ -72,6 +123,8 @@ class Config(BaseModel):
     defaults: Optional[ThemeConfig]
     current: Optional[ThemeConfig]
     colors: ColorsConfig
+    render: Optional[RenderConfig]
+    checksums: Optional[ChecksumsConfig]
 
 
 # Functions:
@@ -93,42 +146,39 @@ def generate_config(data_path: Path) -> str:
     return toml.dumps(cfg.dict())
 
 
-def get_data_dir() -> Path:
-    """Get the data directory's path, where all data files, hooks and output files are
-    stored.
-
-    By default, the path is is ``$XDG_DATA_HOME/dotmix``, but it can be modified by
-    setting the environemt variable ``$DOTMIX_DATA_DIR``.
-
-    :return: Data path
-    """
-    env_vars = ["DOTMIX_DATA_DIR", ("XDG_DATA_HOME", True)]
-
-    return Path(get_path_from_env(env_vars))
-
-
-def get_config_dir() -> Path:
-    """Get the configuration directory's path, where the configuration is stored.
-
-    By default, the path is is ``$XDG_CONFIG_HOME/dotmix``, but it can be modified by
-    setting the environemt variable ``$DOTMIX_CONFIG_DIR``.
+_config_cache: Dict[Path, Tuple[ConfigStat, Config]] = {}
 
-    :return: Config path"""
 
-    env_vars = ["DOTMIX_CONFIG_DIR", ("XDG_CONFIG_HOME", True)]
+def _stat_config(path: Path) -> Optional[ConfigStat]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
 
-    return Path(get_path_from_env(env_vars))
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
 
 
 def get_config() -> Config:
     """Reads the configuration file and returns a :class:`dotmix.config.Config` instance
 
+    The instance is cached, and the file is only read again if its mtime, size or
+    inode changed. The returned instance is shared, so it must not be modified (use
+    :meth:`pydantic.BaseModel.copy` first).
+
     :returns: Parsed configuration model instance
     """
-    config_path = get_config_dir()
-    cfg = load_toml_cfg_model(config_path / "config.toml", Config)
+    config_file = get_config_dir() / "config.toml"
+    stat = _stat_config(config_file)
+
+    cached = _config_cache.get(config_file)
+    if stat and cached and cached[0] == stat:
+        return cached[1]
+
+    cfg = load_toml_cfg_model(config_file, Config)
 
     if cfg:
+        if stat:
+            _config_cache[config_file] = (stat, cfg)
         return cfg
 
     else:
@@ -137,10 +187,18 @@ def get_config() -> Config:
 
 
 def set_config(cfg: Config):
-    config_path = get_config_dir() / "config.toml"
+    """Write the configuration file atomically, so a concurrent :func:`get_config`
+    never reads a partially written file.
+
+    :param cfg: Configuration model instance
+    """
+    config_file = get_config_dir() / "config.toml"
 
-    with config_path.open("w") as f:
-        f.writelines(toml.dumps(cfg.dict()))
+    write_file_atomic(config_file, toml.dumps(cfg.dict()).encode("utf-8"))
+
+    stat = _stat_config(config_file)
+    if stat:
+        _config_cache[config_file] = (stat, cfg)
 
 
 def get_default_setting(type: ThemeKeys) -> Optional[str]:
@@ -163,6 +221,26 @@ def get_default_setting(type: ThemeKeys) -> Optional[str]:
         return v
 
 
+def get_render_config() -> RenderConfig:
+    """Get the render configuration from :attr:`dotmix.config.Config.render`. If it's
+    not defined, a model instance with the default values is returned.
+
+    :return: Render configuration
+    """
+
+    return get_config().render or RenderConfig()
+
+
+def get_checksums_config() -> ChecksumsConfig:
+    """Get the checksums configuration from :attr:`dotmix.config.Config.checksums`. If
+    it's not defined, a model instance with the default values is returned.
+
+    :return: Checksums configuration
+    """
+
+    return get_config().checksums or ChecksumsConfig()
+
+
 def get_current_theme() -> Optional[ThemeConfig]:
     """Get the current applied theme from :attr:`dotmix.config.Config.theme`
 
@@ -180,8 +258,7 @@ def set_current_theme(
     pre_hook: Optional[str],
     post_hook: Optional[str],
 ):
-    cfg = get_config()
-    cfg.current = ThemeConfig(
+    current = ThemeConfig(
         appearance=appearance,
         typography=typography,
         colorscheme=colorscheme,
@@ -189,6 +266,13 @@ def set_current_theme(
         pre_hook=pre_hook,
         post_hook=post_hook,
     )
+
+    cfg = get_config()
+    if cfg.current == current:
+        return
+
+    cfg = cfg.copy()
+    cfg.current = current
     set_config(cfg)
 
 
@@ -5,16 +5,17 @@ data modules are built upon.
 """
 
 import os
-import re
 from abc import ABCMeta, abstractmethod
-from functools import cache, cached_property
+from functools import cache, cached_property, partial, wraps
 from pathlib import Path
 from typing import (
+    Any,
     Callable,
     Dict,
     Generic,
     List,
     Optional,
+    Tuple,
     Type,
     TypedDict,
     TypeVar,
@@ -24,10 +25,10 @@ from typing import (
 
 from pydantic import BaseModel
 
+from dotmix.datacache import load_data_cfg_model
 from dotmix.utils import (
     deep_merge,
-    load_toml_cfg,
-    load_toml_cfg_model,
+    load_toml_header,
     print_err,
     print_key_values,
     print_wrn,
@@ -62,12 +63,32 @@ class DataFileMetadata(TypedDict):
     id: str
     name: str
     path: Path
+    extends: Optional[str]
 
 
 DataFilesDict = Dict[str, DataFileMetadata]
 """Dictionary of :class:`dotmix.data.DataFileMetadata`"""
 
 
+class ResolvedData(TypedDict):
+    """Typing for the dictionary that is returned by
+    :func:`dotmix.data.resolve_all_data`
+
+    :param id: ID of the data instance
+    :param name: Name of the data instance
+    :param parents: IDs of the parents, from the closest one to the root
+    :param data: Computed data of the instance
+    """
+
+    id: str
+    name: str
+    parents: List[str]
+    data: Any
+
+
+ResolvedDataDict = Dict[str, ResolvedData]
+
+
 # Models:
 
 
@@ -197,46 +218,45 @@ class AbstractData(Generic[DataFileModelType, DataType], metaclass=ABCMeta):
         """
         pass
 
-    @classmethod
-    def _get_parents(
-        cls: Type[DataClassType],
-        get_all_instances: Callable[[], Dict[str, DataClassType]],
-        configs: List[DataClassType],
-    ) -> List[DataClassType]:
-        """Class method that tecursively populates and returns a list with the class
-        instance and all parents (extended) instances
+    @property
+    def parent(self: DataClassType) -> Optional[DataClassType]:
+        """Closest parent (extended) instance
 
-        This is meant to be called in :attr:`dotmix.data.AbstractData.parents` with a
-        ``get_all_instances`` function that returns the config files that can be
-        used with this particular subclass
+        :returns: Parent instance or ``None`` if this instance doesn't extend another
         """
-        last_cfg = configs[-1].file_data
+        return self.parents[1] if len(self.parents) > 1 else None
 
-        if not last_cfg.extends:
-            return configs
+    @cached_property
+    def merged_custom(self) -> Dict[str, CustomDictTypes]:
+        """Custom dict of this instance merged with the custom dicts of its parents.
 
-        parent = next(
-            (c for c in get_all_instances().values() if c.id == last_cfg.extends),
-            None,
-        )
+        Only the merged dict of the closest parent is merged with the custom dict of
+        this instance. Parent instances are cached and they keep their merged dict, so
+        every instance in an ``extends`` tree is merged once.
+        """
+        custom = self.file_data.custom or {}
+        if not self.parent:
+            return custom
 
-        if parent is None:
-            print_wrn(
-                f"{last_cfg.name} tried to extend {last_cfg.extends} but it doesn't exists",  # noqa: E501
-            )
-            return configs
+        return deep_merge(self.parent.merged_custom, custom)
 
-        try:
-            if parent in configs:
-                raise RecursionError
-        except RecursionError:
-            print_err(
-                f"{last_cfg.name} tried to extend {last_cfg.extends} but it was extended before",  # noqa: E501
-                True,
-            )
+    def _get_parents(
+        self: DataClassType,
+        getter: GenericDataGetter[DataClassType],
+        graph: "ExtendsGraph",
+    ) -> List[DataClassType]:
+        """Get a list with the instance and all parents (extended) instances. Parents
+        are looked up by ID in the ``extends`` graph, so this takes one lookup per
+        parent.
+
+        This is meant to be called in :attr:`dotmix.data.AbstractData.parents` with the
+        getter and the graph of this particular subclass
+        """
+        parents = [self]
+        for id in graph.get_ancestors(self.id):
+            parents.append(cast(DataClassType, getter(id)))
 
-        configs.append(parent)
-        return cls._get_parents(get_all_instances, configs)
+        return parents
 
 
 class BasicData(AbstractData[DataFileModel, BaseModel]):
@@ -245,30 +265,161 @@ class BasicData(AbstractData[DataFileModel, BaseModel]):
     """
 
     def load_data_file(self):
-        self.file_data = load_toml_cfg_model(self.data_file_path, DataFileModel)
+        self.file_data = load_data_cfg_model(self.data_file_path, DataFileModel)
 
     def compute_data(self):
-        if not self.file_data.custom:
-            self.data = BaseModel.construct(**{})
-            return
+        self.data = BaseModel.construct(**self.merged_custom)
 
-        if not self.file_data.extends:
-            self.data = BaseModel.construct(**self.file_data.custom)
+    def print_data(self):
+        print_key_values(self.data.dict())
 
-        data_dict = {}
-        for parent in reversed(self.parents):
-            data_dict = deep_merge(data_dict, parent.file_data.custom)
 
-        self.data = BaseModel.construct(**data_dict)
+class ExtendsGraph:
+    """Precomputed ``extends`` relations between the data files of a category.
 
-    def print_data(self):
-        print_key_values(self.data.dict())
+    The graph is built from the metadata of the data files, so data files don't have
+    to be loaded to find the parents of an instance. The ancestors of every ID are
+    resolved once, and cycles are detected while resolving them.
+
+    :param files: :data:`dotmix.data.DataFilesDict` of the category
+    """
+
+    files: DataFilesDict
+    _ancestors: Dict[str, List[str]]
+
+    def __init__(self, files: DataFilesDict):
+        self.files = files
+        self._ancestors = {}
+
+    def get_ancestors(self, id: str) -> List[str]:
+        """Get the IDs of the parents of a data file, from the closest one to the
+        root. If a parent doesn't exist, the ancestors up to that parent are returned.
+        If the ``extends`` relations have a cycle, this exits with an error.
+
+        :param id: ID of the data file
+        :returns: IDs of the ancestors
+        """
+        if id in self._ancestors:
+            return self._ancestors[id]
+
+        chain = [id]
+        seen = {id}
+
+        while True:
+            current = self.files[chain[-1]]
+            parent = current["extends"]
+
+            if not parent:
+                break
+
+            if parent not in self.files:
+                print_wrn(
+                    f"{current['name']} tried to extend {parent} but it doesn't exists"
+                )
+                break
+
+            if parent in seen:
+                print_err(
+                    f"{current['name']} tried to extend {parent} but it was extended before",  # noqa: E501
+                    True,
+                )
+
+            if parent in self._ancestors:
+                chain += [parent, *self._ancestors[parent]]
+                break
+
+            chain.append(parent)
+            seen.add(parent)
+
+        for i, child in enumerate(chain):
+            self._ancestors[child] = chain[i + 1 :]
+
+        return self._ancestors[id]
+
+    def get_order(self) -> List[str]:
+        """Get the IDs of all data files in topological order, so every ID comes after
+        the IDs of its parents.
+
+        :returns: Sorted IDs
+        """
+        return sorted(self.files, key=lambda id: len(self.get_ancestors(id)))
 
 
 # Functions:
 
+_data_caches: List[Tuple[Optional[str], Callable[[], None]]] = []
+"""Functions that clear the caches created by :func:`dotmix.data.data_cache`, with
+the data category of the cache"""
 
-@cache
+_data_access_hook: Optional[Callable[[], None]] = None
+"""Function called before the next access to a cache created by
+:func:`dotmix.data.data_cache`"""
+
+CachedFunction = TypeVar("CachedFunction", bound=Callable)
+"""Type for functions decorated by :func:`dotmix.data.data_cache`"""
+
+
+def data_cache(
+    func: Optional[CachedFunction] = None, *, category: Optional[str] = None
+) -> Any:
+    """Decorator that works like :func:`functools.cache` and registers the cache, so
+    it's cleared by :func:`dotmix.data.clear_data_caches`.
+
+    This should be used instead of :func:`functools.cache` by functions that return
+    values computed from data files. It can be used as ``@data_cache``, or as
+    ``@data_cache(category=...)`` for functions that only read the data files of one
+    category.
+
+    :param func: Function to cache
+    :param category: Name of the data directory of the category (e.g.
+        ``colorschemes``)
+    """
+    if func is None:
+        return partial(data_cache, category=category)
+
+    cached = cache(func)
+    _data_caches.append((category, cached.cache_clear))
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        global _data_access_hook
+
+        if _data_access_hook:
+            hook = _data_access_hook
+            _data_access_hook = None
+            hook()
+
+        return cached(*args, **kwargs)
+
+    return cast(CachedFunction, wrapper)
+
+
+def clear_data_caches(category: Optional[str] = None) -> None:
+    """Clear the caches created by :func:`dotmix.data.data_cache`. Long running
+    processes should call this when data files change.
+
+    :param category: Name of the data directory of the category whose files changed.
+        If it's set, only the caches of the category and the caches without category
+        are cleared. Otherwise, every cache is cleared
+    """
+    for cache_category, cache_clear in _data_caches:
+        if category is None or cache_category in (None, category):
+            cache_clear()
+
+
+def set_data_access_hook(hook: Optional[Callable[[], None]]) -> None:
+    """Set a function that is called once, before the next access to a cache created
+    by :func:`dotmix.data.data_cache`. Long running processes can use it to check
+    if data files changed only when cached data is used.
+
+    :param hook: Function to call or None to remove the current one
+    """
+    global _data_access_hook
+
+    _data_access_hook = hook
+
+
+@data_cache
 def get_data_files(dir: Path) -> DataFilesDict:
     """ "Generic" function to get all the data files in a directory.
 
@@ -282,21 +433,48 @@ def get_data_files(dir: Path) -> DataFilesDict:
 
     files_dict: DataFilesDict = {}
 
-    files = [f for f in os.listdir(dir) if re.match(r".*\.toml", f)]
-
-    for file in files:
-        path = Path(dir / file)
+    with os.scandir(dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".toml") or not entry.is_file():
+                continue
 
-        cfg = load_toml_cfg(Path(dir / file))
-        name = cfg["name"]
-        id = path.with_suffix("").name
+            id = entry.name[: -len(".toml")]
+            metadata = get_data_file_metadata(id, Path(entry.path))
 
-        if cfg and name:
-            files_dict[id] = {"id": id, "path": path, "name": name}
+            if metadata:
+                files_dict[id] = metadata
 
     return files_dict
 
 
+def get_data_file_metadata(id: str, path: Path) -> Optional[DataFileMetadata]:
+    """Get the metadata of a data file. Only the keys before the first table of the
+    file are parsed (see :func:`dotmix.utils.load_toml_header`), so data files are
+    listed without parsing their data. Data files are fully parsed when the
+    ``file_data`` of their instance is accessed.
+
+    :param id: ID of the data file
+    :param path: Path of the data file
+    :returns: Metadata of the data file, or ``None`` if it doesn't have a name
+    """
+    cfg = load_toml_header(path)
+    if not cfg:
+        return None
+
+    name = cfg.get("name")
+    extends = cfg.get("extends")
+
+    if not name or not isinstance(name, str):
+        return None
+
+    return {
+        "id": id,
+        "path": path,
+        "name": name,
+        "extends": extends if isinstance(extends, str) else None,
+    }
+
+
 def get_data_by_id(
     id: str, files: DataFilesDict, cls: Type[DataClassType]
 ) -> Optional[DataClassType]:
@@ -342,3 +520,35 @@ def get_all_data_instances(
             cfgs[name] = c
 
     return cfgs
+
+
+def resolve_all_data(
+    graph: ExtendsGraph, getter: GenericDataGetter[DataClassType]
+) -> ResolvedDataDict:
+    """Generic function that computes the data of all instances of a data class.
+
+    Instances are resolved in topological order, so the data of every parent is
+    computed before the data of its children and it's reused by all of them.
+
+    Every submodule that defines a data class should define a function that calls this
+    function with specific ``graph`` and ``getter`` parameters.
+
+    :param graph: :class:`dotmix.data.ExtendsGraph` of the data class
+    :param getter: Generic function that calls :func:`dotmix.data.get_data_by_id` to
+        return a data class instance
+    :returns: Resolved data by ID, in the same order as the data files
+    """
+
+    resolved: ResolvedDataDict = {}
+
+    for id in graph.get_order():
+        instance = getter(id)
+        if instance:
+            resolved[id] = {
+                "id": id,
+                "name": instance.name,
+                "parents": graph.get_ancestors(id),
+                "data": instance.data,
+            }
+
+    return {id: resolved[id] for id in graph.files if id in resolved}
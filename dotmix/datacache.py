@@ -0,0 +1,98 @@
+"""Module for the on-disk cache of parsed data files.
+
+Data files are parsed and validated every time a data instance is loaded. This cache
+stores the validated form of every data file, with the mtime and size of the file
+when it was parsed. If the stat of a data file is the same as the stored one, it's
+loaded without parsing or validating it again.
+
+Entries are pickled, so validated models are stored as model instances.
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Tuple, Type
+
+from dotmix import __version__
+from dotmix.utils import (
+    BaseModelType,
+    get_data_dir,
+    load_toml_cfg_model,
+    print_verbose,
+    write_file_atomic,
+)
+
+DATA_CACHE_VERSION = 1
+"""Version of the data cache format. Entries with a different version (or stored by
+a different version of dotmix, whose models may be different) are ignored"""
+
+DataCacheKey = Tuple[int, str, str, int, int]
+"""Cache format version, dotmix version, model, mtime and size of a data file"""
+
+
+def get_data_cache_dir() -> Path:
+    """Get the data cache directory
+
+    :returns: Data cache directory
+    """
+    return get_data_dir() / ".cache" / "data"
+
+
+def _get_model_name(model: Type[Any]) -> str:
+    return f"{model.__module__}.{model.__qualname__}"
+
+
+def _get_entry_file(path: Path, model_name: str) -> Path:
+    name = hashlib.sha1(f"{path.absolute()}\0{model_name}".encode("utf-8"))
+    return get_data_cache_dir() / f"{name.hexdigest()}.pickle"
+
+
+def load_data_cfg_model(path: Path, model: Type[BaseModelType]) -> BaseModelType:
+    """Load a data file into a model instance like
+    :func:`dotmix.utils.load_toml_cfg_model`, using the data cache
+
+    :param path: Path of the data file
+    :param model: Model class
+    :returns: Instance of the model
+    """
+    model_name = _get_model_name(model)
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        # The loader prints the error
+        return load_toml_cfg_model(path, model)
+
+    key: DataCacheKey = (
+        DATA_CACHE_VERSION,
+        __version__,
+        model_name,
+        stat.st_mtime_ns,
+        stat.st_size,
+    )
+    entry_file = _get_entry_file(path, model_name)
+
+    try:
+        with entry_file.open("rb") as f:
+            entry_key, value = pickle.load(f)
+
+        if entry_key == key:
+            return value
+    except FileNotFoundError:
+        pass
+    except Exception:
+        # Entries are only read by dotmix, so any error means the entry is invalid
+        print_verbose(f"Cached data of {path} is invalid, ignoring it")
+
+    value = load_toml_cfg_model(path, model)
+
+    try:
+        entry_file.parent.mkdir(parents=True, exist_ok=True)
+        write_file_atomic(
+            entry_file, pickle.dumps((key, value), pickle.HIGHEST_PROTOCOL)
+        )
+    except (OSError, pickle.PicklingError):
+        print_verbose(f"Data of {path} couldn't be cached")
+
+    return value
@@ -1,27 +1,35 @@
 """Data module for filesets"""
 
+import json
 import os
+from fnmatch import fnmatchcase
 from functools import cached_property
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, TypedDict
 
 import click
-from pydantic import BaseModel
 
 from dotmix.data import (
     AbstractData,
     DataFileModel,
     DataFilesDict,
+    ExtendsGraph,
+    ResolvedDataDict,
+    data_cache,
     get_all_data_instances,
     get_data_by_id,
+    get_data_file_metadata,
+    resolve_all_data,
 )
 
 from .config import get_data_dir
-from .utils import deep_merge, load_toml_cfg_model
+from .datacache import load_data_cfg_model
+from .utils import write_file_atomic
 
 
-class FileModel(BaseModel):
-    """Model for individual files
+class FileModel:
+    """Template file of a fileset. Filesets can have thousands of files, so this is a
+    plain class with slots instead of a model
 
     :param id: Unique id that identifies the file. Can be used to detect collisions
         between a fileset instance and its parents
@@ -29,37 +37,81 @@ class FileModel(BaseModel):
     :param fileset: Fileset instance associated with this file
     """
 
+    __slots__ = ("id", "path", "fileset")
+
     id: str
     path: Path
     fileset: "Fileset"
 
-    class Config:
-        arbitrary_types_allowed = True
+    def __init__(self, id: str, path: Path, fileset: "Fileset"):
+        self.id = id
+        self.path = path
+        self.fileset = fileset
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.id}>"
 
 
 FileModelDict = Dict[str, FileModel]
 """Dictionary of fileset files"""
 
+FILE_TREE_INDEX_VERSION = 1
+"""Version of the file tree index format. Indexes with a different version are
+rebuilt"""
+
+IGNORE_FILE = ".dotmixignore"
+"""File in a fileset directory with patterns of paths that are not templates"""
+
+VCS_DIRS = frozenset([".git", ".hg", ".svn", ".bzr", "_darcs", "CVS"])
+"""Version control directories, which are always ignored in filesets"""
+
+
+class FileTreeDir(TypedDict):
+    """Typing for the directories of the file tree index of a fileset
+
+    :param mtime_ns: Modification time of the directory in nanoseconds
+    :param files: Names of the files that are not ignored
+    :param dirs: Names of the subdirectories that are not ignored
+    """
+
+    mtime_ns: int
+    files: List[str]
+    dirs: List[str]
+
+
+class FileTreeIndex(TypedDict):
+    """Typing for the file tree index of a fileset
+
+    :param version: Version of the index format
+    :param ignore: Ignore patterns used to build the index
+    :param dirs: Directories by path relative to the fileset directory
+    """
+
+    version: int
+    ignore: List[str]
+    dirs: Dict[str, FileTreeDir]
+
 
 class Fileset(AbstractData[DataFileModel, FileModelDict]):
     """Data class for filesets"""
 
     def load_data_file(self):
-        self.file_data = load_toml_cfg_model(self.data_file_path, DataFileModel)
+        self.file_data = load_data_cfg_model(self.data_file_path, DataFileModel)
 
     @cached_property
     def parents(self) -> List["Fileset"]:
-        return self._get_parents(get_filesets, [self])
+        return self._get_parents(get_fileset_by_id, get_fileset_graph())
 
     def compute_data(self) -> None:
-        if not self.file_data or not self.file_data.extends:
+        if not self.file_data or not self.parent:
             self.data = get_paths_from_fileset(self)
+            return
 
-        file_paths: FileModelDict = {}
-        for p in reversed(self.parents):
-            file_paths = deep_merge(file_paths, get_paths_from_fileset(p))
-
-        self.data = file_paths
+        # The data of the parent already has the files of all its parents, and files
+        # of this fileset override them
+        files = dict(self.parent.data)
+        files.update(get_paths_from_fileset(self))
+        self.data = files
 
     def print_data(self):
         for p in reversed(self.parents):
@@ -76,9 +128,6 @@ class Fileset(AbstractData[DataFileModel, FileModelDict]):
             click.echo("")
 
 
-FileModel.update_forward_refs()
-
-
 def get_filesets_dir() -> Path:
     """Get filesets directory.
 
@@ -88,7 +137,8 @@ def get_filesets_dir() -> Path:
     return get_data_dir() / "filesets"
 
 
-def get_fileset_files():
+@data_cache(category="filesets")
+def get_fileset_files() -> DataFilesDict:
     """Get filesets data files.
 
     :returns: Fileset data files dictionary
@@ -101,15 +151,24 @@ def get_fileset_files():
         path = dir / "settings.toml"
 
         if path.exists():
-            cfg = load_toml_cfg_model(path, DataFileModel)
-            id = dir.name
+            metadata = get_data_file_metadata(dir.name, path)
 
-            if cfg and cfg.name:
-                fileset_data_files[id] = {"id": id, "path": path, "name": cfg.name}
+            if metadata:
+                fileset_data_files[dir.name] = metadata
 
     return fileset_data_files
 
 
+@data_cache(category="filesets")
+def get_fileset_graph() -> ExtendsGraph:
+    """Get the ``extends`` graph of filesets.
+
+    :returns: Graph of fileset data files
+    """
+
+    return ExtendsGraph(get_fileset_files())
+
+
 def get_filesets() -> Dict[str, Fileset]:
     """Get all fileset instances.
 
@@ -119,6 +178,16 @@ def get_filesets() -> Dict[str, Fileset]:
     return get_all_data_instances(get_fileset_files(), get_fileset_by_id)
 
 
+def resolve_filesets() -> ResolvedDataDict:
+    """Compute the data of all filesets.
+
+    :returns: Resolved fileset data by ID
+    """
+
+    return resolve_all_data(get_fileset_graph(), get_fileset_by_id)
+
+
+@data_cache(category="filesets")
 def get_fileset_by_id(id: str) -> Optional[Fileset]:
     """Get a specific fileset instance by id.
 
@@ -129,28 +198,172 @@ def get_fileset_by_id(id: str) -> Optional[Fileset]:
     return get_data_by_id(id, get_fileset_files(), Fileset)
 
 
+def get_ignore_patterns(dir: Path) -> List[str]:
+    """Get the patterns of paths that are ignored in a fileset, from the
+    :data:`IGNORE_FILE` in its directory. Empty lines and lines that start with ``#``
+    are skipped.
+
+    :param dir: Fileset directory
+    :returns: List of patterns
+    """
+    try:
+        with (dir / IGNORE_FILE).open("r") as f:
+            lines = [line.strip() for line in f]
+    except OSError:
+        return []
+
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def is_ignored(relative_path: str, is_dir: bool, patterns: List[str]) -> bool:
+    """Check if a path of a fileset is ignored.
+
+    Patterns are matched with :func:`fnmatch.fnmatchcase`. Like in ``.gitignore``,
+    patterns that contain a ``/`` are matched against the path relative to the
+    fileset directory, other patterns are matched against the name of the file, and
+    patterns that end with ``/`` only match directories. Negated patterns are not
+    supported.
+
+    :param relative_path: Path relative to the fileset directory, separated by ``/``
+    :param is_dir: Flag to indicate if the path is a directory
+    :param patterns: Patterns returned by :func:`get_ignore_patterns`
+    :returns: True if the path is ignored
+    """
+    name = relative_path.rpartition("/")[2]
+    if is_dir and name in VCS_DIRS:
+        return True
+
+    for pattern in patterns:
+        if pattern.endswith("/"):
+            if not is_dir:
+                continue
+            pattern = pattern.rstrip("/")
+
+        if "/" in pattern:
+            if fnmatchcase(relative_path, pattern.lstrip("/")):
+                return True
+        elif fnmatchcase(name, pattern):
+            return True
+
+    return False
+
+
+def get_fileset_index_file(id: str) -> Path:
+    """Get the file tree index file of a fileset
+
+    :param id: Fileset ID
+    :returns: File tree index file
+    """
+    return get_data_dir() / ".cache" / "filesets" / f"{id}.json"
+
+
+def _read_tree_index(file: Path) -> Optional[FileTreeIndex]:
+    try:
+        with file.open("r") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(index, dict) or index.get("version") != FILE_TREE_INDEX_VERSION:
+        return None
+
+    return index
+
+
+def _scan_tree_dir(
+    dir: Path, relative_dir: str, mtime_ns: int, patterns: List[str]
+) -> FileTreeDir:
+    entry: FileTreeDir = {"mtime_ns": mtime_ns, "files": [], "dirs": []}
+
+    with os.scandir(dir) as children:
+        for child in children:
+            relative_path = (
+                f"{relative_dir}/{child.name}" if relative_dir else child.name
+            )
+            is_dir = child.is_dir()
+
+            if is_ignored(relative_path, is_dir, patterns):
+                continue
+
+            if not is_dir:
+                entry["files"].append(child.name)
+            elif not child.is_symlink():
+                # Like os.walk, symlinks to directories are not followed
+                entry["dirs"].append(child.name)
+
+    return entry
+
+
+def get_fileset_tree(f: Fileset) -> Dict[str, List[str]]:
+    """Get the files of a fileset directory that are not ignored (see
+    :func:`is_ignored`), grouped by directory.
+
+    The tree is stored in an index in the data directory, with the mtime of every
+    directory. Only directories whose mtime changed are listed again, and ignored
+    directories are never walked. The index is rebuilt if the ignore patterns change.
+
+    :param f: Fileset instance
+    :returns: Names of files by directory, relative to the fileset directory (the
+        fileset directory itself is ``""``)
+    """
+    root = f.data_file_path.parent
+    patterns = get_ignore_patterns(root)
+    index_file = get_fileset_index_file(f.id)
+
+    index = _read_tree_index(index_file)
+    previous = index["dirs"] if index and index["ignore"] == patterns else {}
+    changed = not previous
+
+    dirs: Dict[str, FileTreeDir] = {}
+    stack = [""]
+
+    while stack:
+        relative_dir = stack.pop()
+        dir = root / relative_dir
+
+        try:
+            mtime_ns = os.stat(dir).st_mtime_ns
+        except OSError:
+            changed = True
+            continue
+
+        entry = previous.get(relative_dir)
+        if not entry or entry["mtime_ns"] != mtime_ns:
+            entry = _scan_tree_dir(dir, relative_dir, mtime_ns, patterns)
+            changed = True
+
+        dirs[relative_dir] = entry
+        stack.extend(
+            f"{relative_dir}/{name}" if relative_dir else name for name in entry["dirs"]
+        )
+
+    if changed or len(dirs) != len(previous):
+        index = {"version": FILE_TREE_INDEX_VERSION, "ignore": patterns, "dirs": dirs}
+        try:
+            index_file.parent.mkdir(parents=True, exist_ok=True)
+            write_file_atomic(index_file, json.dumps(index).encode("utf-8"))
+        except OSError:
+            pass
+
+    return {relative_dir: entry["files"] for relative_dir, entry in dirs.items()}
+
+
 def get_paths_from_fileset(f: Fileset) -> FileModelDict:
-    """Recusrively get all template files from fileset
+    """Get all template files from fileset. Files are listed with
+    :func:`get_fileset_tree`, so ignored files are skipped.
 
     :param f: Fileset instance
     :returns: Dictionary of file models
     """
     files: FileModelDict = {}
     dir = f.data_file_path.parent
-    for (dirpath, _, filenames) in os.walk(dir):
-        if not filenames or any(map(lambda f: f == "settings.toml", filenames)):
+    for relative_dir, filenames in get_fileset_tree(f).items():
+        if not relative_dir or "settings.toml" in filenames:
             # Skip any files in root directory (i.e. files alongside template.toml)
             continue
 
-        dir_path = Path(dirpath)
-
-        absolute_paths: List[Path] = []
-        absolute_paths.extend(
-            map(lambda f: dir_path.joinpath(f), filenames),
-        )
-
-        for path in absolute_paths:
-            id = str(path.relative_to(dir))
-            files[id] = FileModel(id=id, path=path, fileset=f)
+        for filename in filenames:
+            id = f"{relative_dir}/{filename}"
+            files[id] = FileModel(id, dir / id, f)
 
     return files
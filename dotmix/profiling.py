@@ -0,0 +1,140 @@
+"""Module for profiling :func:`dotmix.runner.apply`. It contains the profiler that
+records the wall and CPU time spent in every phase and in the rendering of every
+file"""
+
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Iterator, NamedTuple, Tuple
+
+import click
+
+SLOWEST_FILES = 10
+"""Number of files printed by :meth:`Profiler.print_table`"""
+
+
+class Timing(NamedTuple):
+    """Time spent doing something
+
+    :param wall: Wall time in seconds
+    :param cpu: CPU time in seconds
+    """
+
+    wall: float
+    cpu: float
+
+    def __add__(self, other):
+        return Timing(self.wall + other.wall, self.cpu + other.cpu)
+
+
+def timed(func: Callable, *args, **kwargs) -> Tuple[Any, Timing]:
+    """Call a function and measure it. CPU time is measured for the current thread,
+    so this can be used in thread and process pool workers.
+
+    This is defined at module level so it can be sent to process pool workers.
+
+    :param func: Function to call
+    :returns: Return value of the function and time spent
+    """
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    result = func(*args, **kwargs)
+
+    return result, Timing(time.perf_counter() - wall, time.thread_time() - cpu)
+
+
+class Profiler:
+    """Records the time spent in phases and in rendering files.
+
+    Phases are measured with the CPU time of the whole process, so they include the
+    time of thread pool workers but not the time of process pool workers. Phases
+    that are entered more than once are added up.
+    """
+
+    enabled = True
+    phases: Dict[str, Timing]
+    files: Dict[str, Timing]
+
+    def __init__(self):
+        self.phases = {}
+        self.files = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Context manager that measures a phase
+
+        :param name: Name of the phase
+        """
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            timing = Timing(time.perf_counter() - wall, time.process_time() - cpu)
+            self.phases[name] = self.phases.get(name, Timing(0, 0)) + timing
+
+    def add_file(self, path: str, timing: Timing) -> None:
+        """Record the time spent rendering a file
+
+        :param path: Relative path of the output file
+        :param timing: Time spent rendering the file returned by :func:`timed`
+        """
+        self.files[path] = timing
+
+    @property
+    def total(self) -> Timing:
+        """Time spent in all phases"""
+        return sum(self.phases.values(), Timing(0, 0))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the recorded times as a dictionary that can be serialized as JSON
+
+        :returns: Dictionary with the times of the phases and files in seconds
+        """
+        return {
+            "total": self.total._asdict(),
+            "phases": {k: v._asdict() for k, v in self.phases.items()},
+            "files": {k: v._asdict() for k, v in self.files.items()},
+        }
+
+    def write_json(self, path: Path) -> None:
+        """Write the recorded times to a JSON file
+
+        :param path: Output file
+        """
+        with path.open("w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def print_table(self) -> None:
+        """Print the recorded times of the phases and the slowest files"""
+
+        def row(name: str, timing: Timing) -> str:
+            return f"{name:<24} {timing.wall * 1000:>10.2f} {timing.cpu * 1000:>10.2f}"
+
+        click.secho(f"{'Phase':<24} {'Wall (ms)':>10} {'CPU (ms)':>10}", bold=True)
+        for name, timing in self.phases.items():
+            click.echo(row(name, timing))
+        click.secho(row("Total", self.total), bold=True)
+
+        if self.files:
+            slowest = sorted(self.files.items(), key=lambda f: f[1].wall, reverse=True)
+            click.echo("")
+            title = f"Slowest of {len(self.files)} files"
+            click.secho(f"{title:<24} {'Wall (ms)':>10} {'CPU (ms)':>10}", bold=True)
+            for path, timing in slowest[:SLOWEST_FILES]:
+                click.echo(row(path, timing))
+
+
+class DisabledProfiler(Profiler):
+    """Profiler that doesn't record anything. It's used when profiling is disabled,
+    so phases only cost a call to a shared no-op context manager."""
+
+    enabled = False
+    _null_context = nullcontext()
+
+    def phase(self, name: str) -> ContextManager[None]:  # type: ignore[override]
+        return self._null_context
+
+    def add_file(self, path: str, timing: Timing) -> None:
+        pass
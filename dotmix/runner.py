@@ -1,35 +1,84 @@
 """ Module for running dotmix. This module contains functions to work with the template
     engine, computing checksums and running hooks"""
 import hashlib
+import json
 import os
 import shutil
 import subprocess
 import sys
-import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
-from typing import Callable, Dict, List, Optional, Set, Tuple, cast
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypedDict,
+    cast,
+)
 
 import chevron
 import click
 
+from dotmix import __version__
 from dotmix.appearance import Appearance, get_appearance_by_id
+from dotmix.checksums import (
+    Manifest,
+    ManifestEntry,
+    ManifestFiles,
+    diff_manifest,
+    hash_bytes,
+    hash_file,
+    hash_files,
+    make_entry,
+    read_manifest,
+    update_manifest,
+    walk_files,
+    write_manifest,
+)
 from dotmix.colorscheme import Colorscheme, get_colorscheme_by_id
 from dotmix.config import (
+    HashAlgorithm,
+    OutputMode,
+    RenderBackend,
     ThemeKeys,
+    get_checksums_config,
     get_data_dir,
     get_default_setting,
+    get_render_config,
     set_current_theme,
 )
 from dotmix.data import DataClassType, GenericDataGetter
 from dotmix.fileset import FileModel, Fileset, get_fileset_by_id
+from dotmix.profiling import DisabledProfiler, Profiler, timed
+from dotmix.template import (
+    TemplateCache,
+    TemplateDependencies,
+    Token,
+    compile_template,
+    get_dependency_values,
+    get_template_cache,
+    get_template_cache_dir,
+    resolve_partials,
+)
 from dotmix.typography import Typography, get_typography_by_id
 from dotmix.utils import (
+    clone_file,
     get_verbose,
+    link_tree,
     print_err,
     print_key_values,
     print_pair,
     print_verbose,
     print_wrn,
+    write_file_atomic,
 )
 
 
@@ -41,22 +90,36 @@ def get_out_dir() -> Path:
     return get_data_dir() / "out"
 
 
-def get_checksums_file() -> Path:
-    """Get the checksums files.
+def get_out_backup_dir() -> Path:
+    """Get the output backup directory. The backup is a copy of the output files
+    that is only made when the checksums manifest can't be written, so modifications
+    of the output files can still be detected.
 
-    :returns: Checksums file
+    :returns: Output backup directory
     """
 
-    return get_data_dir() / ".checksums"
+    return get_data_dir() / ".out.backup"
 
 
-def get_out_backup_dir() -> Path:
-    """Get the output backup directory.
+def get_out_staging_dir() -> Path:
+    """Get the directory where new output files are rendered before replacing the
+    current ones. It's in the same filesystem as the output directory, so output
+    files can be moved without copying them.
 
-    :returns: Output backup directory
+    :returns: Output staging directory
     """
 
-    return get_data_dir() / ".out.backup"
+    return get_data_dir() / ".out.staging"
+
+
+def get_out_previous_dir() -> Path:
+    """Get the directory where the previous output files are kept while running
+    :func:`apply`, so they can be restored if the post hook fails.
+
+    :returns: Previous output directory
+    """
+
+    return get_data_dir() / ".out.previous"
 
 
 def get_hooks_dir() -> Path:
@@ -111,36 +174,83 @@ def run_hook(hook: str) -> int:
         return return_code
 
 
-def hash_file(file: Path) -> str:
-    """Create a sha256 hash of a file
+def write_checksums(files: ManifestFiles, algorithm: HashAlgorithm = "sha256") -> None:
+    """Write hashes and stats of output files to the checksums manifest.
 
-    :param file: File to hash
+    .. warning::
+        This function should be called only when running :func:`apply` because it is
+        used to check for changes of the current output files. If called afterwards,
+        there's risk of losing changes.
 
-    :returns: Generated hash
+    :param files: Manifest entries returned by :func:`render_fileset`
+    :param algorithm: Name of the hash algorithm of the entries
     """
-    with file.open("rb") as f:
-        hash = hashlib.sha256(f.read()).hexdigest()
-        return hash
 
+    write_manifest(files, algorithm)
 
-def write_checksums() -> None:
-    """Write hashes of output files to checksums file.
 
-    .. warning::
-        This function should be called only when running :func:`apply` because it is
-        used to check for changes of the current output files. If called afterwards,
-        there's risk of losing changes.
+class Fingerprint(TypedDict):
+    """Inputs that produced an output file. If all of them are the same in the next
+    run, the output file doesn't need to be rendered again.
+
+    :param template: Hash of the template content
+    :param context: Hash of the variables read by the template and the content of its
+        partials
+    :param version: Version of dotmix
     """
 
-    data_dir = get_data_dir()
-    checksums = []
-    for root, _, files in os.walk(get_out_dir()):
-        for file in files:
-            path = Path(root, file)
-            checksums.append(f"{hash_file(path)} {path.relative_to(data_dir)}\n")
+    template: str
+    context: str
+    version: str
+
+
+Fingerprints = Dict[str, Fingerprint]
+"""Dictionary of fingerprints by relative path of the output files"""
+
+
+def get_fingerprints_file() -> Path:
+    """Get the fingerprints file.
+
+    :returns: Fingerprints file
+    """
+
+    return get_data_dir() / ".fingerprints"
+
+
+def read_fingerprints() -> Fingerprints:
+    """Read the fingerprints of the current output files.
+
+    :returns: Fingerprints or an empty dictionary if there are no stored fingerprints
+    """
+    try:
+        with get_fingerprints_file().open("r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_fingerprints(fingerprints: Fingerprints) -> None:
+    """Write the fingerprints of the current output files.
+
+    :param fingerprints: Fingerprints returned by :func:`render_fileset`
+    """
+    write_file_atomic(get_fingerprints_file(), json.dumps(fingerprints).encode("utf-8"))
+
+
+_context_hashes: Dict[str, Dict[Tuple[str, Tuple], str]] = {}
+"""Context hashes of templates by template and partial hashes, for the last hash of
+all the variables. Long running processes (i.e. watch mode) render the same templates
+with the same variables repeatedly, so they don't have to hash them again"""
 
-    with get_checksums_file().open("w") as f:
-        f.writelines(checksums)
+
+def hash_context(vars: Dict) -> str:
+    """Create a sha256 hash of variables fed to the template engine
+
+    :param vars: Variables to hash
+    :returns: Generated hash
+    """
+    context = json.dumps(vars, sort_keys=True, default=str)
+    return hashlib.sha256(context.encode("utf-8")).hexdigest()
 
 
 def get_settings(
@@ -185,6 +295,106 @@ def get_settings(
         return settings
 
 
+class PreviousRender(NamedTuple):
+    """Output files of a previous run that can be reused by :func:`render_fileset`
+
+    :param dir: Directory with the output files
+    :param fingerprints: Fingerprints of the output files
+    :param files: Checksums manifest entries of the output files
+    :param algorithm: Name of the hash algorithm of the manifest entries
+    """
+
+    dir: Path
+    fingerprints: Fingerprints
+    files: ManifestFiles
+    algorithm: HashAlgorithm
+
+
+class RenderResult(NamedTuple):
+    """Result of :func:`render_fileset`
+
+    :param fingerprints: Fingerprints of the output files
+    :param files: Checksums manifest entries of the output files
+    """
+
+    fingerprints: Fingerprints
+    files: ManifestFiles
+
+
+def _is_unchanged(
+    path: Path,
+    size: int,
+    hash: str,
+    entry: Optional[ManifestEntry],
+    algorithm: HashAlgorithm,
+) -> bool:
+    """Check if an existing file has the given content. The file is only hashed if
+    its size matches and its stat doesn't match the manifest entry.
+
+    :param path: Existing file
+    :param size: Size of the new content
+    :param hash: Hash of the new content
+    :param entry: Checksums manifest entry of the existing file (if any)
+    :param algorithm: Name of the hash algorithm of ``hash`` and ``entry``
+    :returns: True if the file exists and has the same content
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+
+    if stat.st_size != size:
+        return False
+
+    if entry and make_entry(stat, entry["hash"]) == entry:
+        return entry["hash"] == hash
+
+    return hash_file(path, algorithm) == hash
+
+
+def _render_template(
+    tokens: List[Token],
+    out_path: str,
+    existing_path: Optional[str],
+    existing_entry: Optional[ManifestEntry],
+    vars: Dict,
+    warn: bool,
+    algorithm: HashAlgorithm = "sha256",
+) -> ManifestEntry:
+    """Render a parsed template and write the output file.
+
+    If an existing version of the output file has the same content, it's linked (or
+    kept, if it's the same path) instead of being written, so its mtime doesn't
+    change. Otherwise, the file is written atomically.
+
+    This is the unit of work of :func:`render_fileset`. It's defined at module level
+    and only takes plain values so it can be sent to process pool workers.
+
+    :param tokens: Token stream of the template
+    :param out_path: Absolute path of the output file. Its directory must exist
+    :param existing_path: Path of the existing version of the output file
+    :param existing_entry: Checksums manifest entry of the existing version, hashed
+        with ``algorithm``
+    :param vars: Input variables for the template engine
+    :param warn: Flag to warn about missing keys
+    :param algorithm: Name of the hash algorithm for the manifest entry
+    :returns: Checksums manifest entry of the output file, hashed from the rendered
+        content
+    """
+    rendered = cast(str, chevron.render(tokens, vars, warn=warn)).encode("utf-8")
+    hash = hash_bytes(rendered, algorithm)
+
+    if existing_path and _is_unchanged(
+        Path(existing_path), len(rendered), hash, existing_entry, algorithm
+    ):
+        if existing_path != out_path:
+            clone_file(existing_path, out_path)
+    else:
+        write_file_atomic(out_path, rendered)
+
+    return make_entry(os.stat(out_path), hash)
+
+
 def render_file(file: FileModel, relative_path: str, out_dir: str, vars: Dict) -> None:
     """Read template file and write output file.
 
@@ -193,25 +403,205 @@ def render_file(file: FileModel, relative_path: str, out_dir: str, vars: Dict) -
     :param out_dir: Directory for output files
     :param vars: Input variables for the template engine
     """
-    with open(file.path, "r") as f:
-        out_file = Path(out_dir) / relative_path
-        print_verbose(f"Rendering file: {str(out_file)}")
-        rendered = cast(str, chevron.render(f, vars, warn=get_verbose()))
-        os.makedirs(out_file.parent, exist_ok=True)
-        with out_file.open("w", encoding="utf-8") as out:
-            out.write(rendered)
+    out_file = Path(out_dir) / relative_path
+    print_verbose(f"Rendering file: {str(out_file)}")
+    os.makedirs(out_file.parent, exist_ok=True)
+    tokens = compile_template(str(file.path)).tokens
+    _render_template(tokens, str(out_file), None, None, vars, get_verbose())
+
+
+@contextmanager
+def _worker_map(
+    jobs: int, backend: RenderBackend, size: int
+) -> Iterator[Callable[..., Iterable]]:
+    """Context manager that yields a function that works like :func:`map` but runs
+    in a pool of workers.
+
+    :param jobs: Number of workers. If it's 1, the builtin :func:`map` is used
+    :param backend: Executor backend for the workers ("thread" or "process")
+    :param size: Number of items that will be mapped
+    """
+    if jobs == 1 or size <= 1:
+        yield map
+        return
+
+    if backend == "process":
+        executor: Executor = ProcessPoolExecutor(max_workers=jobs)
+        chunksize = max(1, size // (jobs * 4))
+    elif backend == "thread":
+        executor = ThreadPoolExecutor(max_workers=jobs)
+        chunksize = 1
+    else:
+        raise ValueError('backend should be "thread" or "process"')
+
+    with executor:
+        yield partial(executor.map, chunksize=chunksize)
+
+
+def render_fileset(
+    fileset: Fileset,
+    out_dir: str,
+    vars: Dict,
+    jobs: Optional[int] = None,
+    backend: RenderBackend = "thread",
+    cache: Optional[TemplateCache] = None,
+    previous: Optional[PreviousRender] = None,
+    incremental: bool = False,
+    algorithm: HashAlgorithm = "sha256",
+    profiler: Optional[Profiler] = None,
+) -> RenderResult:
+    """Render and write a complete fileset.
 
+    Output directories are created once before rendering starts and then the files
+    are rendered concurrently by a pool of workers. The output is the same regardless
+    of the number of workers or the backend.
 
-def render_fileset(fileset: Fileset, out_dir: str, vars: Dict) -> None:
-    """Render and write a complete fileset.
+    The fingerprint of every file only takes into account the variables that its
+    template (and its partials) read. If ``previous`` is set and running in
+    incremental mode, files whose fingerprint didn't change are linked from the
+    previous output directory instead of being rendered again. Rendered files whose
+    content is the same as in the previous output directory are linked too, so only
+    files that actually changed are written and get a new mtime. ``out_dir`` may be
+    the previous output directory itself.
+
+    Output files are hashed while they are written, so the returned checksums
+    manifest entries don't require reading the files again.
 
     :param fileset: Fileset to be rendered
     :param out_dir: Output files directory
     :param vars: Input variables for the tempalte engine
+    :param jobs: Number of workers. If it's not set, the number of CPUs is used. If
+        it's 1, files are rendered serially in the current thread
+    :param backend: Executor backend for the workers ("thread" or "process")
+    :param cache: Cache of parsed templates. If it's set, only templates that are not
+        cached are tokenized, and the cache is saved after rendering
+    :param previous: Output files of a previous run
+    :param incremental: Flag to reuse files whose fingerprint didn't change without
+        rendering them
+    :param algorithm: Name of the hash algorithm for the checksums manifest entries
+    :param profiler: Profiler that records the time spent rendering every file
+    :returns: Fingerprints and checksums manifest entries of the output files
     """
 
-    for relative_dir, file in fileset.data.items():
-        render_file(file, relative_dir, out_dir, vars)
+    relative_paths = list(fileset.data.keys())
+    templates = [file.path for file in fileset.data.values()]
+    out_files = [Path(out_dir) / relative_path for relative_path in relative_paths]
+    in_place = previous is not None and previous.dir == Path(out_dir)
+
+    for dir in sorted({out_file.parent for out_file in out_files}):
+        os.makedirs(dir, exist_ok=True)
+
+    hashes: List[Optional[str]] = [cache.hash(t) if cache else None for t in templates]
+    dependencies: List[Optional[TemplateDependencies]] = [
+        cache.get_dependencies(h) if cache and h else None for h in hashes
+    ]
+    tokens: List[Optional[List[Token]]] = [None] * len(templates)
+
+    misses = [i for i, d in enumerate(dependencies) if d is None]
+    print_verbose(f"Parsing {len(misses)} of {len(templates)} templates")
+
+    render = partial(
+        _render_template, vars=vars, warn=get_verbose(), algorithm=algorithm
+    )
+    jobs = jobs or os.cpu_count() or 1
+
+    with _worker_map(jobs, backend, len(templates)) as worker_map:
+        compiled = worker_map(compile_template, [str(templates[i]) for i in misses])
+        for i, template in zip(misses, compiled):
+            hashes[i], tokens[i], dependencies[i] = template
+            if cache:
+                cache.put(templates[i], template)
+
+        fingerprints: Fingerprints = {}
+        files: ManifestFiles = {}
+        resolved_partials: Dict = {}
+        stale: List[int] = []
+
+        vars_hash = hash_context(vars)
+        if vars_hash not in _context_hashes:
+            _context_hashes.clear()
+        context_hashes = _context_hashes.setdefault(vars_hash, {})
+
+        for i, relative_path in enumerate(relative_paths):
+            keys, partials = cast(TemplateDependencies, dependencies[i])
+            partial_keys, partial_hashes = resolve_partials(partials, resolved_partials)
+
+            context_key = (cast(str, hashes[i]), tuple(partial_hashes.items()))
+            context_hash = context_hashes.get(context_key)
+            if context_hash is None:
+                context = {
+                    "vars": get_dependency_values(vars, partial_keys.union(keys)),
+                    "partials": partial_hashes,
+                }
+                context_hash = context_hashes[context_key] = hash_context(context)
+
+            fingerprint: Fingerprint = {
+                "template": cast(str, hashes[i]),
+                "context": context_hash,
+                "version": __version__,
+            }
+            fingerprints[relative_path] = fingerprint
+
+            if (
+                incremental
+                and previous
+                and previous.fingerprints.get(relative_path) == fingerprint
+            ):
+                previous_file = (
+                    out_files[i] if in_place else previous.dir / relative_path
+                )
+                previous_entry = previous.files.get(relative_path)
+                if previous_entry and previous_file.is_file():
+                    if not in_place:
+                        clone_file(previous_file, out_files[i])
+
+                    files[relative_path] = make_entry(
+                        os.stat(out_files[i]),
+                        previous_entry["hash"]
+                        if previous.algorithm == algorithm
+                        else hash_file(out_files[i], algorithm),
+                    )
+                    continue
+
+            stale.append(i)
+            if tokens[i] is None:
+                tokens[i] = (cache and cache.get(templates[i])) or compile_template(
+                    str(templates[i])
+                ).tokens
+
+        print_verbose(f"Reusing {len(templates) - len(stale)} unchanged files")
+        if get_verbose():
+            for i in stale:
+                print_verbose(f"Rendering file: {out_files[i]}")
+
+        existing_paths: List[Optional[str]] = [None] * len(stale)
+        existing_entries: List[Optional[ManifestEntry]] = [None] * len(stale)
+        if previous:
+            for j, i in enumerate(stale):
+                existing_paths[j] = str(previous.dir / relative_paths[i])
+                if previous.algorithm == algorithm:
+                    existing_entries[j] = previous.files.get(relative_paths[i])
+
+        args = (
+            [tokens[i] for i in stale],
+            [str(out_files[i]) for i in stale],
+            existing_paths,
+            existing_entries,
+        )
+        if profiler and profiler.enabled:
+            for i, (entry, timing) in zip(
+                stale, worker_map(partial(timed, render), *args)
+            ):
+                files[relative_paths[i]] = entry
+                profiler.add_file(relative_paths[i], timing)
+        else:
+            for i, entry in zip(stale, worker_map(render, *args)):
+                files[relative_paths[i]] = entry
+
+    if cache:
+        cache.save()
+
+    return RenderResult(fingerprints, files)
 
 
 def merge_data(
@@ -261,9 +651,36 @@ def check_fileset_changes(
 ) -> Optional[FilesetChanges]:
     """Check previously generated files were modified
 
+    The files are compared against the checksums manifest written by
+    :func:`write_checksums`, so only files whose stat changed are hashed. If there's
+    no manifest (e.g. it was written by an older version), they are compared against
+    the backup of the output files.
+
     :param out_dir: Root path of output files
     :returns: `:data:FilesetChanges` or None, if there are no changes
     """
+    manifest = read_manifest()
+
+    if manifest:
+        changes = diff_manifest(out_dir, manifest)
+    else:
+        changes = compare_with_backup(out_dir)
+        if changes is None:
+            return None
+
+    if all(len(c) == 0 for c in changes):
+        return None
+
+    return changes
+
+
+def compare_with_backup(out_dir: Path) -> Optional[FilesetChanges]:
+    """Compare output files against the backup of the output files by hashing every
+    file in both directories.
+
+    :param out_dir: Root path of output files
+    :returns: `:data:FilesetChanges` or None, if there is no backup
+    """
     backup_dir = get_out_backup_dir()
 
     # Check if dir exists, and if so if it's empty
@@ -297,28 +714,22 @@ def check_fileset_changes(
 
     removed_files: List[str] = [str(file) for file in backup_files - new_out_files]
     new_files: List[str] = [str(file) for file in new_out_files - backup_files]
-    modified_files: List[str] = []
-
-    for file in backup_files & new_out_files:
-        relative_path = str(file)
+    common_files = [str(file) for file in backup_files & new_out_files]
+    new_hashes = hash_files(Path(out_dir, file) for file in common_files)
+    backup_hashes = hash_files(Path(backup_dir, file) for file in common_files)
 
-        new_hash = hash_file(Path(out_dir, relative_path))
-        backup_hash = hash_file(Path(backup_dir, relative_path))
+    modified_files: List[str] = [
+        file
+        for file, new_hash, backup_hash in zip(common_files, new_hashes, backup_hashes)
+        if new_hash != backup_hash
+    ]
 
-        if new_hash != backup_hash:
-            modified_files.append(relative_path)
-
-    changes = (
+    return (
         new_files,
         modified_files,
         removed_files,
     )
 
-    if all(len(c) == 0 for c in changes):
-        return None
-
-    return changes
-
 
 def print_fileset_changes(changes: FilesetChanges, verbose: bool = True):
     settings = {
@@ -355,6 +766,78 @@ def print_fileset_changes(changes: FilesetChanges, verbose: bool = True):
                 click.echo("")
 
 
+def _run_pre_hook(pre_hook: Optional[str], profiler: Profiler) -> None:
+    """Run the pre hook (if any) and ask to abort if it fails
+
+    :param pre_hook: Filename for pre hook
+    :param profiler: Profiler that records the time spent running the hook
+    """
+    if not pre_hook:
+        return
+
+    click.echo(f"Running pre hook: {pre_hook}")
+    with profiler.phase("pre hook"):
+        code = run_hook(pre_hook)
+    if code != 0:
+        print_err(f"Hook {pre_hook} finished with an error")
+        if click.confirm("Abort?", abort=False):
+            sys.exit(1)
+
+
+def remove_untracked_files(dir: Path, files: ManifestFiles) -> None:
+    """Remove the files of a directory that are not in the manifest entries, and any
+    directory that is left empty.
+
+    :param dir: Directory with output files
+    :param files: Manifest entries of the output files
+    """
+    for relative_path, _ in walk_files(dir):
+        if relative_path not in files:
+            print_verbose(f"Removing file: {relative_path}")
+            (dir / relative_path).unlink()
+
+    for root, _, _ in os.walk(dir, topdown=False):
+        if root != str(dir) and not os.listdir(root):
+            os.rmdir(root)
+
+
+def restore_previous_output(
+    out_dir: Path,
+    previous_dir: Path,
+    fileset: Fileset,
+    vars: Dict,
+    manifest: Optional[Manifest],
+    modified: Iterable[str] = (),
+) -> None:
+    """Replace the output directory with the previous output files.
+
+    Output files that were not written by the render are linked with the previous
+    ones, so a hook that modifies them in place also modifies the previous files.
+    Previous files that don't match the previous checksums manifest are rendered
+    again, since their previous content is the same that was rendered.
+
+    :param out_dir: Output directory
+    :param previous_dir: Directory with the previous output files
+    :param fileset: Rendered fileset
+    :param vars: Input variables for the template engine
+    :param manifest: Checksums manifest of the previous output files
+    :param modified: Relative paths of the previous output files that were modified
+        by the user. They don't match the manifest, but they are kept
+    """
+    shutil.rmtree(out_dir)
+    if previous_dir.exists():
+        os.rename(previous_dir, out_dir)
+
+    if not manifest:
+        return
+
+    _, changed, _ = diff_manifest(out_dir, manifest)
+    for relative_path in set(changed).difference(modified):
+        file = fileset.data.get(relative_path)
+        if file:
+            render_file(file, relative_path, str(out_dir), vars)
+
+
 def apply(
     *,
     colorscheme_id: Optional[str] = None,
@@ -366,6 +849,11 @@ def apply(
     use_defaults: bool = True,
     force: bool = False,
     interactive: bool = False,
+    jobs: Optional[int] = None,
+    backend: Optional[RenderBackend] = None,
+    incremental: Optional[bool] = None,
+    output_mode: Optional[OutputMode] = None,
+    profiler: Optional[Profiler] = None,
 ) -> None:
     """Main function of dotmix.
 
@@ -378,19 +866,45 @@ def apply(
     :param appearance: ID for appearance
     :param typography: ID for typogrpahy
     :param pre_hook: Filename for pre_hook
-    :param post_hook: Filename for post hook
+    :param post_hook: Filename for post hook. If it fails, the previous output files
+        can be restored with :func:`restore_previous_output`
     :param use_defaults: Flag to determine if defaults should be used
     :param force: Flag to force running even if files where modified
     :param interactive: If it's true, this function will ask for confirmation before
         running. This parameter is true when running from the CLI
+    :param jobs: Number of workers used to render the fileset. If it's not set, the
+        value from the render configuration is used
+    :param backend: Executor backend used to render the fileset. If it's not set, the
+        value from the render configuration is used
+    :param incremental: Flag to only render files whose template or variables changed
+        since the last run. If it's not set, the value from the render configuration
+        is used
+    :param output_mode: How output files are replaced. With "swap", the new files are
+        rendered in a staging directory that replaces the output directory. With
+        "update", only files that changed are written in the output directory. If
+        it's not set, the value from the render configuration is used
+    :param profiler: Profiler that records the time spent in every phase. If it's
+        not set, nothing is recorded
     """
 
-    fileset = get_settings("fileset", fileset_id, get_fileset_by_id, use_defaults)
+    profiler = profiler or DisabledProfiler()
+
+    with profiler.phase("config"):
+        render_config = get_render_config()
+        algorithm = get_checksums_config().algorithm
+
+    with profiler.phase("data"):
+        fileset = get_settings("fileset", fileset_id, get_fileset_by_id, use_defaults)
+        if fileset:
+            # The files of a fileset are listed when its data is first accessed, so
+            # it's done here to not record it as rendering time
+            fileset.data
 
     if not fileset:
         return print_err("No fileset specified", True)
 
-    changes = check_fileset_changes(get_out_dir())
+    with profiler.phase("changes"):
+        changes = check_fileset_changes(get_out_dir())
 
     if changes:
         click.secho("You have made changes in your generated files: \n")
@@ -401,17 +915,18 @@ def apply(
                 True,
             )
 
-    colorscheme = get_settings(
-        "colorscheme", colorscheme_id, get_colorscheme_by_id, use_defaults
-    )
-    appearance = get_settings(
-        "appearance", appearance_id, get_appearance_by_id, use_defaults
-    )
-    typography = get_settings(
-        "typography", typography_id, get_typography_by_id, use_defaults
-    )
+    with profiler.phase("data"):
+        colorscheme = get_settings(
+            "colorscheme", colorscheme_id, get_colorscheme_by_id, use_defaults
+        )
+        appearance = get_settings(
+            "appearance", appearance_id, get_appearance_by_id, use_defaults
+        )
+        typography = get_settings(
+            "typography", typography_id, get_typography_by_id, use_defaults
+        )
 
-    vars = merge_data(colorscheme, typography, appearance)
+        vars = merge_data(colorscheme, typography, appearance)
 
     click.echo("Running dotmix with the following settings:\n")
     print_pair("Fileset", f"{fileset.name} ({fileset.id})")
@@ -446,45 +961,117 @@ def apply(
 
     click.echo("")
 
-    with tempfile.TemporaryDirectory(prefix="dotmix_out") as tmp_dir:
-        render_fileset(fileset, tmp_dir, vars)
-        check_fileset_changes(Path(tmp_dir))
-
-        if pre_hook:
-            click.echo(f"Running pre hook: {pre_hook}")
-            code = run_hook(pre_hook)
-            if code != 0:
-                print_err(f"Hook {pre_hook} finished with an error")
-                if click.confirm("Abort?", abort=False):
-                    sys.exit(1)
+    out_dir = get_out_dir()
+    staging_dir = get_out_staging_dir()
+    previous_dir = get_out_previous_dir()
+    backup_dir = get_out_backup_dir()
 
-        out_dir = get_out_dir()
-        backup_dir = get_out_backup_dir()
+    for dir in (staging_dir, previous_dir):
+        if dir.exists():
+            print_verbose(f"Removing leftovers of a previous run: {dir}")
+            shutil.rmtree(dir)
+
+    if incremental is None:
+        incremental = render_config.incremental
+
+    if output_mode is None:
+        output_mode = render_config.output_mode
+
+    previous: Optional[PreviousRender] = None
+    with profiler.phase("changes"):
+        manifest = read_manifest()
+        if manifest and out_dir.exists():
+            previous = PreviousRender(
+                out_dir,
+                read_fingerprints() if incremental else {},
+                manifest["files"],
+                manifest["algorithm"],
+            )
+            if changes:
+                # Modified output files are rendered again to discard the
+                # modifications
+                for relative_path in changes[1]:
+                    previous.fingerprints.pop(relative_path, None)
+
+    render = partial(
+        render_fileset,
+        fileset,
+        vars=vars,
+        jobs=jobs or render_config.jobs,
+        backend=backend or render_config.backend,
+        cache=get_template_cache(get_template_cache_dir(), render_config.cache_size),
+        previous=previous,
+        incremental=incremental,
+        algorithm=algorithm,
+        profiler=profiler,
+    )
 
-        if backup_dir.exists():
-            click.echo("Removing previous backup")
-            shutil.rmtree(backup_dir)
+    if output_mode == "update":
+        _run_pre_hook(pre_hook, profiler)
 
         if out_dir.exists():
-            click.echo("Making backup of previous output files")
-            shutil.move(out_dir, backup_dir)
+            click.echo("Making snapshot of previous output files")
+            with profiler.phase("backup"):
+                link_tree(out_dir, previous_dir)
+
+        click.echo("Updating output files")
+        try:
+            with profiler.phase("render"):
+                fingerprints, files = render(str(out_dir))
+                remove_untracked_files(out_dir, files)
+        except BaseException:
+            if previous_dir.exists():
+                shutil.rmtree(out_dir)
+                os.rename(previous_dir, out_dir)
+            raise
+
+    else:
+        with profiler.phase("render"):
+            fingerprints, files = render(str(staging_dir))
 
-        click.echo("Copying new output files from temporary directory")
-        shutil.copytree(tmp_dir, out_dir)
+        _run_pre_hook(pre_hook, profiler)
 
-        if post_hook:
-            click.echo(f"Running post hook: {post_hook}")
+        with profiler.phase("swap"):
+            if out_dir.exists():
+                click.echo("Moving previous output files")
+                os.rename(out_dir, previous_dir)
+
+            click.echo("Moving new output files from staging directory")
+            os.rename(staging_dir, out_dir)
+
+    if post_hook:
+        click.echo(f"Running post hook: {post_hook}")
+        with profiler.phase("post hook"):
             code = run_hook(post_hook)
-            if code != 0:
-                print_err(f"Hook {post_hook} finished with an error")
-                if click.confirm("Revert and restore backup?", abort=False):
-                    click.echo("Restoring backup of previous out files")
-                    shutil.rmtree(out_dir)
-                    shutil.move(backup_dir, out_dir)
-                    sys.exit(1)
-
-        click.echo("Computing checksums\n")
-        write_checksums()
+        if code != 0:
+            print_err(f"Hook {post_hook} finished with an error")
+            if click.confirm("Revert and restore backup?", abort=False):
+                click.echo("Restoring backup of previous out files")
+                restore_previous_output(
+                    out_dir,
+                    previous_dir,
+                    fileset,
+                    vars,
+                    manifest,
+                    changes[1] if changes else [],
+                )
+                sys.exit(1)
+
+        # The post hook may have modified the output files
+        with profiler.phase("post hook"):
+            files = update_manifest(out_dir, files, algorithm)
+
+    click.echo("Writing checksums\n")
+    with profiler.phase("checksums"):
+        try:
+            write_checksums(files, algorithm)
+            manifest_written = True
+        except OSError as e:
+            print_err(f"Failed to write checksums: {e}")
+            manifest_written = False
+        write_fingerprints(fingerprints)
+
+    with profiler.phase("config"):
         set_current_theme(
             appearance_id,
             typography_id,
@@ -494,8 +1081,139 @@ def apply(
             post_hook,
         )
 
-        click.echo("Making backup of new output files")
-        shutil.rmtree(backup_dir)
-        shutil.copytree(out_dir, backup_dir)
+    with profiler.phase("backup"):
+        if previous_dir.exists():
+            shutil.rmtree(previous_dir)
+
+        if manifest_written:
+            # Modifications are detected with the manifest, so a backup would be
+            # outdated (and compared against the output files if the manifest is
+            # removed)
+            if backup_dir.exists():
+                shutil.rmtree(backup_dir)
+        else:
+            # The backup is only compared against the output files when there is no
+            # valid manifest. It must not share inodes with them: an in-place edit
+            # of a hardlinked output file would modify its backup too
+            click.echo("Making backup of new output files")
+            link_tree(out_dir, staging_dir, hardlink=False)
+            if backup_dir.exists():
+                os.rename(backup_dir, previous_dir)
+            os.rename(staging_dir, backup_dir)
+            if previous_dir.exists():
+                shutil.rmtree(previous_dir)
+
+    click.secho("Done!", fg="green", bold=True)
+
+
+def apply_changes(
+    *,
+    colorscheme_id: Optional[str] = None,
+    fileset_id: Optional[str] = None,
+    appearance_id: Optional[str] = None,
+    typography_id: Optional[str] = None,
+    post_hook: Optional[str] = None,
+    use_defaults: bool = True,
+    jobs: Optional[int] = None,
+    backend: Optional[RenderBackend] = None,
+    profiler: Optional[Profiler] = None,
+) -> Optional[List[str]]:
+    """Render again the output files affected by changes of data files or templates
+    since the last run of :func:`apply`. This is used by the watch command.
+
+    Files are rendered in place and incrementally, so only the files whose template
+    or variables changed (according to their fingerprints) are rendered, and only
+    the ones whose content changed are written. Unlike :func:`apply`, output files
+    are not checked for modifications (re-rendered files are overwritten), the
+    previous output files are not kept, the pre hook is not run and the current
+    theme is not stored in the configuration. The post hook only runs if output files
+    changed.
+
+    Data caches must be cleared (see :func:`dotmix.data.clear_data_caches`) for the
+    data files that changed before calling this function.
+
+    The parameters are the same as :func:`apply`.
+
+    :returns: Relative paths of the output files that were written or removed, or
+        None if there are no output files of a previous run (:func:`apply` must be
+        used instead)
+    """
+
+    profiler = profiler or DisabledProfiler()
+
+    with profiler.phase("config"):
+        render_config = get_render_config()
+        algorithm = get_checksums_config().algorithm
+
+    out_dir = get_out_dir()
+    with profiler.phase("changes"):
+        manifest = read_manifest()
+        if not manifest or not out_dir.exists():
+            return None
+
+        previous = PreviousRender(
+            out_dir, read_fingerprints(), manifest["files"], manifest["algorithm"]
+        )
+
+    with profiler.phase("data"):
+        fileset = get_settings("fileset", fileset_id, get_fileset_by_id, use_defaults)
+        if not fileset:
+            return print_err("No fileset specified", True)
+        fileset.data
+
+        colorscheme = get_settings(
+            "colorscheme", colorscheme_id, get_colorscheme_by_id, use_defaults
+        )
+        appearance = get_settings(
+            "appearance", appearance_id, get_appearance_by_id, use_defaults
+        )
+        typography = get_settings(
+            "typography", typography_id, get_typography_by_id, use_defaults
+        )
+
+        vars = merge_data(colorscheme, typography, appearance)
+
+    with profiler.phase("render"):
+        fingerprints, files = render_fileset(
+            fileset,
+            str(out_dir),
+            vars,
+            jobs=jobs or render_config.jobs,
+            backend=backend or render_config.backend,
+            cache=get_template_cache(
+                get_template_cache_dir(), render_config.cache_size
+            ),
+            previous=previous,
+            incremental=True,
+            algorithm=algorithm,
+            profiler=profiler,
+        )
+
+        for relative_path in previous.files.keys() - files.keys():
+            print_verbose(f"Removing file: {relative_path}")
+            (out_dir / relative_path).unlink(missing_ok=True)
+            for dir in (out_dir / relative_path).parents:
+                if dir == out_dir or any(dir.iterdir()):
+                    break
+                dir.rmdir()
+
+    changed = sorted(
+        relative_path
+        for relative_path in previous.files.keys() | files.keys()
+        if files.get(relative_path) != previous.files.get(relative_path)
+    )
+
+    if changed and post_hook:
+        click.echo(f"Running post hook: {post_hook}")
+        with profiler.phase("post hook"):
+            if run_hook(post_hook) != 0:
+                print_err(f"Hook {post_hook} finished with an error")
+
+            # The post hook may have modified the output files
+            files = update_manifest(out_dir, files, algorithm)
+
+    with profiler.phase("checksums"):
+        write_checksums(files, algorithm)
+        write_fingerprints(fingerprints)
 
-        click.secho("Done!", fg="green", bold=True)
+    return changed
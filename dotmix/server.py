@@ -0,0 +1,249 @@
+"""Module for the dotmix server.
+
+The server is a long running process that listens on a unix socket and runs CLI
+commands sent by :mod:`dotmix.client`. Modules are imported once, and data instances
+and parsed templates stay cached in memory between commands, so commands don't pay
+the startup cost of the CLI.
+
+Commands run one at a time. The client sends its standard streams along with the
+request, so commands write to the client terminal and can prompt for confirmation.
+"""
+
+import json
+import os
+import socket
+import sys
+import traceback
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import click
+
+from dotmix.appearance import get_appearances_dir
+from dotmix.client import (
+    connect,
+    get_fallback_socket_dir,
+    get_socket_path,
+    is_private_dir,
+    is_same_user,
+)
+from dotmix.colorscheme import get_colorschemes_dir
+from dotmix.data import clear_data_caches, set_data_access_hook
+from dotmix.fileset import VCS_DIRS, get_filesets_dir
+from dotmix.typography import get_typographies_dir
+from dotmix.utils import get_config_dir, print_err, print_verbose
+from dotmix.watch import Watcher, get_watcher
+
+REQUEST_MAX_FDS = 3
+"""Number of file descriptors sent by the client (stdin, stdout and stderr)"""
+
+WatchedDirs = Tuple[Tuple[Path, bool], ...]
+"""Data directories that are watched, and whether they exist"""
+
+CacheState = Tuple[Optional[str], Optional[Tuple[int, int, int]]]
+"""Colormode of the client and modification time, size and inode of the
+configuration file"""
+
+
+def get_cache_state() -> CacheState:
+    """Get the inputs of the cached data that are not data files. Computed
+    colorschemes depend on the colormode, which is read from ``$DOTMIX_COLORMODE`` or
+    the configuration file.
+
+    :returns: Colormode and stat of the configuration file
+    """
+    config_stat = None
+
+    # get_config_dir exits if the config directory isn't set, but commands that
+    # don't read the configuration still work without it
+    if os.environ.get("DOTMIX_CONFIG_DIR") or os.environ.get("XDG_CONFIG_HOME"):
+        try:
+            stat = os.stat(get_config_dir() / "config.toml")
+            config_stat = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            pass
+
+    return (os.environ.get("DOTMIX_COLORMODE"), config_stat)
+
+
+def _get_exit_code(code: Any) -> int:
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+
+    click.echo(code, err=True)
+    return 1
+
+
+class Server:
+    """Server that runs CLI commands sent by clients
+
+    :param path: Socket path. If it's not set,
+        :func:`dotmix.client.get_socket_path` is used
+    """
+
+    path: str
+    _watcher: Optional[Watcher]
+    _watched_dirs: Optional[WatchedDirs]
+    _state: Optional[CacheState]
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_socket_path()
+        self._watcher = None
+        self._watched_dirs = None
+        self._state = None
+
+    def _refresh_caches(self) -> None:
+        """Clear the cached data if data files, the configuration or the colormode
+        changed. Data directories are watched with :func:`dotmix.watch.get_watcher`,
+        so checking them doesn't scan their files (unless inotify isn't available).
+
+        This is called by the first access to cached data of every command (see
+        :func:`dotmix.data.set_data_access_hook`), so commands that don't read data
+        don't check anything.
+        """
+        dirs = tuple(
+            (dir, dir.is_dir())
+            for dir in (
+                get_colorschemes_dir(),
+                get_typographies_dir(),
+                get_appearances_dir(),
+                get_filesets_dir(),
+            )
+        )
+        state = get_cache_state()
+        changed = state != self._state
+
+        if dirs != self._watched_dirs:
+            if self._watcher:
+                self._watcher.close()
+            self._watcher = get_watcher([dir for dir, exists in dirs if exists])
+            self._watched_dirs = dirs
+            changed = True
+        elif self._watcher:
+            changed = changed or any(
+                not VCS_DIRS.intersection(path.parts) for path in self._watcher.read(0)
+            )
+
+        if changed:
+            if self._state is not None:
+                print_verbose("Data files or colormode changed, clearing cached data")
+            clear_data_caches()
+            self._state = state
+
+    def run(self, request: Dict[str, Any], fds: List[int]) -> int:
+        """Run a command with the environment, working directory and standard streams
+        of the client. They are restored after the command finishes.
+
+        :param request: Request sent by the client
+        :param fds: File descriptors of the client standard streams
+        :returns: Exit code of the command
+        """
+        from dotmix.cli import cli
+
+        environ = dict(os.environ)
+        cwd = os.getcwd()
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved_fds = [os.dup(fd) for fd in range(len(fds))]
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+
+        try:
+            os.environ.clear()
+            os.environ.update(request["env"])
+            os.chdir(request["cwd"])
+            set_data_access_hook(self._refresh_caches)
+            cli.main(request["args"], prog_name=request["prog_name"])
+            return 0
+        except SystemExit as e:
+            return _get_exit_code(e.code)
+        except Exception:
+            traceback.print_exc()
+            return 1
+        finally:
+            set_data_access_hook(None)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            for target, fd in enumerate(saved_fds):
+                os.dup2(fd, target)
+                os.close(fd)
+
+            os.environ.clear()
+            os.environ.update(environ)
+            os.chdir(cwd)
+
+    def handle(self, conn: socket.socket) -> None:
+        """Handle a client connection
+
+        :param conn: Client socket
+        """
+        if not is_same_user(conn):
+            print_err("Refused a request from another user")
+            return
+
+        _, fds, _, _ = socket.recv_fds(conn, 1, REQUEST_MAX_FDS)
+
+        try:
+            with conn.makefile("rwb") as f:
+                line = f.readline()
+                if not line or len(fds) != REQUEST_MAX_FDS:
+                    return
+
+                code = self.run(json.loads(line), fds)
+
+                f.write(json.dumps({"code": code}).encode("utf-8") + b"\n")
+                f.flush()
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def serve(self) -> None:
+        """Listen for clients until the process is interrupted"""
+        dir = os.path.dirname(self.path)
+        if dir == get_fallback_socket_dir():
+            try:
+                os.mkdir(dir, 0o700)
+            except FileExistsError:
+                pass
+            except OSError as e:
+                print_err(f"Failed to create {dir}: {e}", True)
+
+            if not is_private_dir(dir):
+                print_err(f"{dir} must be a directory only accessible by you", True)
+
+        if os.path.exists(self.path):
+            sock = connect(self.path)
+            if sock:
+                sock.close()
+                print_err(f"A dotmix server is already running on {self.path}", True)
+
+            try:
+                os.unlink(self.path)
+            except OSError as e:
+                print_err(f"Failed to remove {self.path}: {e}", True)
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            umask = os.umask(0o177)
+            try:
+                sock.bind(self.path)
+            finally:
+                os.umask(umask)
+
+            try:
+                sock.listen()
+                click.echo(f"Listening on {self.path}")
+
+                while True:
+                    conn, _ = sock.accept()
+                    with conn:
+                        try:
+                            self.handle(conn)
+                        except (OSError, ValueError) as e:
+                            print_err(f"Failed to handle request: {e}")
+            finally:
+                os.unlink(self.path)
+                if self._watcher:
+                    self._watcher.close()
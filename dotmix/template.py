@@ -0,0 +1,484 @@
+"""Module for working with templates. It contains the functions to parse templates,
+to find the variables that templates read and a persistent cache of parsed templates,
+so templates are only tokenized again when they change"""
+
+import hashlib
+import json
+import os
+import time
+from functools import cache
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypedDict,
+)
+
+from chevron.tokenizer import tokenize
+
+from dotmix.config import get_data_dir
+from dotmix.utils import print_verbose, write_file_atomic
+
+Token = Tuple[str, str]
+"""Token of a parsed template (tag type and tag key)"""
+
+TEMPLATE_CACHE_VERSION = 2
+"""Version of the template cache format. Caches with a different version are
+discarded"""
+
+
+USED_RESOLUTION = 60
+"""Time in seconds after which the last use of a cached token stream is updated.
+Uses within this time don't change the index, so it's not written on every run"""
+
+PARTIALS_EXT = "mustache"
+"""Extension of partial files. This is the default used by the template engine"""
+
+MISSING_KEY = "<missing>"
+"""Value used by :func:`get_dependency_values` for keys that are not defined"""
+
+
+class TemplateDependencies(NamedTuple):
+    """Variables and partials that a template reads
+
+    :param keys: Variable paths (e.g. ``colors.red``) looked up from the root of the
+        variables. Keys of sections are included as a whole, because the tags inside
+        a section can read anything from the section value
+    :param partials: Names of the partials included by the template
+    """
+
+    keys: List[str]
+    partials: List[str]
+
+
+class CompiledTemplate(NamedTuple):
+    """Parsed template
+
+    :param hash: Hash of the template content
+    :param tokens: Token stream of the template
+    :param dependencies: Variables and partials read by the template
+    """
+
+    hash: str
+    tokens: List[Token]
+    dependencies: TemplateDependencies
+
+
+class TemplatePathEntry(TypedDict):
+    """Typing for the cached stat of a template file"""
+
+    mtime_ns: int
+    size: int
+    hash: str
+
+
+class TemplateTokensEntry(TypedDict):
+    """Typing for the metadata of a cached token stream"""
+
+    size: int
+    used: float
+    keys: List[str]
+    partials: List[str]
+
+
+def get_template_cache_dir() -> Path:
+    """Get the compiled templates cache directory.
+
+    :returns: Template cache directory
+    """
+
+    return get_data_dir() / ".cache" / "templates"
+
+
+def read_template(path: Path) -> str:
+    """Read the contents of a template file
+
+    :param path: Template file
+    :returns: Template contents
+    """
+    with open(path, "r") as f:
+        return f.read()
+
+
+def hash_template(content: str) -> str:
+    """Create a sha256 hash of the contents of a template
+
+    :param content: Template contents
+    :returns: Generated hash
+    """
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def scan_dependencies(tokens: Iterable[Token]) -> TemplateDependencies:
+    """Statically find the variables and partials that a template reads.
+
+    Tags inside sections may be resolved from the section value or from any outer
+    scope, so they are recorded as root keys, and the section key is recorded too.
+
+    :param tokens: Token stream of the template
+    :returns: Dependencies of the template
+    """
+    keys: Set[str] = set()
+    partials: Set[str] = set()
+
+    for tag, key in tokens:
+        if tag in ("variable", "no escape", "section", "inverted section"):
+            keys.add(key)
+        elif tag == "partial":
+            partials.add(key)
+
+    return TemplateDependencies(sorted(keys), sorted(partials))
+
+
+def compile_template(path: str) -> CompiledTemplate:
+    """Read and tokenize a template file.
+
+    This is defined at module level and only takes plain values so it can be sent to
+    process pool workers.
+
+    :param path: Absolute path of the template file
+    :returns: Parsed template
+    """
+    content = read_template(Path(path))
+    tokens = list(tokenize(content))
+    return CompiledTemplate(hash_template(content), tokens, scan_dependencies(tokens))
+
+
+def get_partial_path(name: str) -> Path:
+    """Get the file of a partial. Partials are looked up the same way as the template
+    engine does it (relative to the working directory).
+
+    :param name: Name of the partial
+    :returns: Partial file
+    """
+    return Path(".") / f"{name}.{PARTIALS_EXT}"
+
+
+def resolve_partials(
+    names: Iterable[str],
+    resolved: Dict[str, Tuple[Optional[str], List[str], List[str]]],
+) -> Tuple[Set[str], Dict[str, Optional[str]]]:
+    """Recursively find the variables read by partials.
+
+    :param names: Names of the partials
+    :param resolved: Dictionary to memoize the hash, keys and partials of every
+        partial that was already read. Missing partials have no hash
+    :returns: Variable paths read by the partials and the hashes of the partials
+    """
+    keys: Set[str] = set()
+    hashes: Dict[str, Optional[str]] = {}
+    pending = list(names)
+
+    while pending:
+        name = pending.pop()
+        if name in hashes:
+            continue
+
+        if name not in resolved:
+            try:
+                content = read_template(get_partial_path(name))
+                dependencies = scan_dependencies(tokenize(content))
+                resolved[name] = (
+                    hash_template(content),
+                    dependencies.keys,
+                    dependencies.partials,
+                )
+            except OSError:
+                resolved[name] = (None, [], [])
+
+        hash, partial_keys, partial_names = resolved[name]
+        hashes[name] = hash
+        keys.update(partial_keys)
+        pending.extend(partial_names)
+
+    return keys, hashes
+
+
+def get_dependency_values(vars: Dict, keys: Iterable[str]) -> Dict[str, Any]:
+    """Get the values of variable paths. Paths are resolved the same way as the
+    template engine does it for the root scope.
+
+    :param vars: Input variables for the template engine
+    :param keys: Variable paths
+    :returns: Dictionary with the value of each path
+    """
+    values: Dict[str, Any] = {}
+
+    for key in keys:
+        if key == ".":
+            values[key] = vars
+            continue
+
+        value: Any = vars
+        try:
+            for child in key.split("."):
+                if isinstance(value, dict):
+                    value = value[child]
+                else:
+                    value = value[int(child)]
+        except (KeyError, IndexError, ValueError, TypeError):
+            value = MISSING_KEY
+
+        values[key] = value
+
+    return values
+
+
+class TemplateCache:
+    """On-disk cache of template token streams.
+
+    Token streams are stored by the hash of the template content, and template paths
+    are mapped to these hashes along with their mtime and size. If the stat of a
+    template is the same as the stored one, its tokens are loaded without reading the
+    template. Otherwise the template content is hashed and looked up again, so
+    templates that were touched but not changed are not tokenized again.
+
+    When the cache is saved, the stored index is read again and merged with the
+    changes of this instance, since other processes (e.g. the CLI and a server) may
+    have stored templates since it was loaded. Then the least recently used token
+    streams are evicted until the cache size is lower than ``max_size``.
+
+    Loaded token streams are also kept in memory, so long running processes that
+    reuse the same instance (see :func:`get_template_cache`) don't read them again.
+
+    :param dir: Directory of the cache
+    :param max_size: Maximum size in bytes of the stored token streams
+    """
+
+    dir: Path
+    max_size: int
+    _paths: Dict[str, TemplatePathEntry]
+    _entries: Dict[str, TemplateTokensEntry]
+    _tokens: Dict[str, List[Token]]
+    _changed_paths: Set[str]
+    _changed_entries: Set[str]
+
+    def __init__(self, dir: Path, max_size: int):
+        self.dir = dir
+        self.max_size = max_size
+        self._paths = {}
+        self._entries = {}
+        self._tokens = {}
+        self._changed_paths = set()
+        self._changed_entries = set()
+        self._load_index()
+
+    @property
+    def index_file(self) -> Path:
+        """File where the cache index is stored"""
+        return self.dir / "index.json"
+
+    def _read_index(
+        self,
+    ) -> Optional[Tuple[Dict[str, TemplatePathEntry], Dict[str, TemplateTokensEntry]]]:
+        try:
+            with self.index_file.open("r") as f:
+                index = json.load(f)
+
+            if index.get("version") == TEMPLATE_CACHE_VERSION:
+                return index["paths"], index["entries"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+        return None
+
+    def _load_index(self) -> None:
+        index = self._read_index()
+        if index is None:
+            print_verbose("Template cache index is missing or invalid, ignoring it")
+            return
+
+        self._paths, self._entries = index
+
+    def _merge_index(self) -> None:
+        index = self._read_index()
+        if index is not None:
+            paths, entries = index
+
+            for key in self._changed_paths:
+                paths[key] = self._paths[key]
+
+            for hash in self._changed_entries:
+                entry = self._entries.get(hash)
+                if entry is None:
+                    entries.pop(hash, None)
+                    continue
+
+                stored = entries.get(hash)
+                if stored:
+                    entry["used"] = max(entry["used"], stored["used"])
+                entries[hash] = entry
+
+            self._paths = paths
+            self._entries = entries
+            self._tokens = {k: v for k, v in self._tokens.items() if k in entries}
+
+        self._changed_paths.clear()
+        self._changed_entries.clear()
+
+    def _mark_used(self, hash: str) -> None:
+        now = time.time()
+        entry = self._entries[hash]
+        if now - entry["used"] >= USED_RESOLUTION:
+            entry["used"] = now
+            self._changed_entries.add(hash)
+
+    def _entry_file(self, hash: str) -> Path:
+        return self.dir / f"{hash}.json"
+
+    def _load_tokens(self, hash: str) -> Optional[List[Token]]:
+        if hash not in self._entries:
+            return None
+
+        tokens = self._tokens.get(hash)
+        if tokens is None:
+            try:
+                with self._entry_file(hash).open("r") as f:
+                    tokens = [(tag, key) for tag, key in json.load(f)]
+            except (OSError, ValueError):
+                del self._entries[hash]
+                self._changed_entries.add(hash)
+                return None
+
+            self._tokens[hash] = tokens
+
+        self._mark_used(hash)
+        return tokens
+
+    def hash(self, path: Path) -> str:
+        """Get the hash of the content of a template. The template is only read if its
+        stat doesn't match the cached one.
+
+        :param path: Template file
+        :returns: Hash of the template content
+        """
+        key = str(path)
+        stat = os.stat(path)
+        entry = self._paths.get(key)
+
+        if entry and (entry["mtime_ns"], entry["size"]) == (
+            stat.st_mtime_ns,
+            stat.st_size,
+        ):
+            return entry["hash"]
+
+        hash = hash_template(read_template(path))
+        self._paths[key] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": hash,
+        }
+        self._changed_paths.add(key)
+
+        return hash
+
+    def get_dependencies(self, hash: str) -> Optional[TemplateDependencies]:
+        """Get the dependencies of a cached template without loading its tokens. Like
+        :meth:`get`, it marks the token stream as used, so templates whose output is
+        reused by incremental runs are not evicted.
+
+        :param hash: Hash of the template content returned by :meth:`hash`
+        :returns: Dependencies or None if the template is not cached
+        """
+        entry = self._entries.get(hash)
+        if not entry:
+            return None
+
+        self._mark_used(hash)
+        return TemplateDependencies(entry["keys"], entry["partials"])
+
+    def get(self, path: Path) -> Optional[List[Token]]:
+        """Get the token stream of a template if it's cached.
+
+        :param path: Template file
+        :returns: Token stream or None if the template has to be tokenized
+        """
+        return self._load_tokens(self.hash(path))
+
+    def put(self, path: Path, template: CompiledTemplate) -> None:
+        """Store the token stream of a template.
+
+        :param path: Template file
+        :param template: Parsed template returned by :func:`compile_template`
+        """
+        stat = os.stat(path)
+        entry_file = self._entry_file(template.hash)
+
+        if template.hash not in self._entries:
+            # The entry is written atomically, so a crash or a concurrent run never
+            # leaves a truncated entry
+            self.dir.mkdir(parents=True, exist_ok=True)
+            write_file_atomic(entry_file, json.dumps(template.tokens).encode("utf-8"))
+
+            self._entries[template.hash] = {
+                "size": entry_file.stat().st_size,
+                "used": time.time(),
+                "keys": template.dependencies.keys,
+                "partials": template.dependencies.partials,
+            }
+            self._tokens[template.hash] = template.tokens
+            self._changed_entries.add(template.hash)
+
+        self._paths[str(path)] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": template.hash,
+        }
+        self._changed_paths.add(str(path))
+
+    def evict(self) -> None:
+        """Remove the least recently used token streams until the size of the cache
+        is lower than :attr:`max_size`"""
+        size = sum(e["size"] for e in self._entries.values())
+        if size <= self.max_size:
+            return
+
+        evicted = set()
+        for hash, entry in sorted(self._entries.items(), key=lambda e: e[1]["used"]):
+            if size <= self.max_size:
+                break
+
+            self._entry_file(hash).unlink(missing_ok=True)
+            size -= entry["size"]
+            evicted.add(hash)
+
+        for hash in evicted:
+            del self._entries[hash]
+            self._tokens.pop(hash, None)
+
+        self._paths = {k: v for k, v in self._paths.items() if v["hash"] not in evicted}
+
+    def save(self) -> None:
+        """Merge the stored index with the changes of this instance, evict old token
+        streams and write the index. Nothing is written if nothing changed"""
+        if not (self._changed_paths or self._changed_entries):
+            return
+
+        self._merge_index()
+        self.evict()
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+        index = {
+            "version": TEMPLATE_CACHE_VERSION,
+            "paths": self._paths,
+            "entries": self._entries,
+        }
+        write_file_atomic(self.index_file, json.dumps(index).encode("utf-8"))
+
+
+@cache
+def get_template_cache(dir: Path, max_size: int) -> TemplateCache:
+    """Get a template cache. The same instance is returned for the same arguments, so
+    parsed templates stay in memory during the whole process.
+
+    :param dir: Directory of the cache
+    :param max_size: Maximum size in bytes of the stored token streams
+    :returns: Template cache
+    """
+    return TemplateCache(dir, max_size)
@@ -1,22 +1,26 @@
 """Data module for typographies"""
 
-from functools import cache, cached_property
+from functools import cached_property
 from typing import Dict, Optional
 
 from dotmix.config import get_data_dir
 from dotmix.data import (
     BasicData,
     DataFilesDict,
+    ExtendsGraph,
+    ResolvedDataDict,
+    data_cache,
     get_all_data_instances,
     get_data_by_id,
     get_data_files,
+    resolve_all_data,
 )
 
 
 class Typography(BasicData):
     @cached_property
     def parents(self):
-        return self._get_parents(get_typographies, [self])
+        return self._get_parents(get_typography_by_id, get_typography_graph())
 
 
 def get_typographies_dir():
@@ -37,6 +41,16 @@ def get_typography_files() -> DataFilesDict:
     return get_data_files(get_typographies_dir())
 
 
+@data_cache(category="typographies")
+def get_typography_graph() -> ExtendsGraph:
+    """Get the ``extends`` graph of typographies.
+
+    :returns: Graph of typography data files
+    """
+
+    return ExtendsGraph(get_typography_files())
+
+
 def get_typographies() -> Dict[str, Typography]:
     """Get all typography instances.
 
@@ -46,7 +60,16 @@ def get_typographies() -> Dict[str, Typography]:
     return get_all_data_instances(get_typography_files(), get_typography_by_id)
 
 
-@cache
+def resolve_typographies() -> ResolvedDataDict:
+    """Compute the data of all typographies.
+
+    :returns: Resolved typography data by ID
+    """
+
+    return resolve_all_data(get_typography_graph(), get_typography_by_id)
+
+
+@data_cache(category="typographies")
 def get_typography_by_id(id: str) -> Optional[Typography]:
     """Get a specific typography instance by id.
 
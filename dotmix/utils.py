@@ -1,14 +1,30 @@
 """Module for general utilitary functions"""
+import errno
+import importlib
 import os
+import shutil
 import sys
+import threading
+from functools import cache, partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 import click
-import toml
-from pydantic.error_wrappers import ValidationError
-from pydantic.main import BaseModel
-from toml import TomlDecodeError
+
+if TYPE_CHECKING:
+    from pydantic.main import BaseModel
 
 VERBOSE = "DOTMIX_VERBOSE"
 """Environment variable name to determine if more information should be printed"""
@@ -81,20 +97,96 @@ def get_path_from_env(env_vars: List[Union[str, Tuple[str, bool]]]) -> str:
     sys.exit(1)
 
 
+def get_data_dir() -> Path:
+    """Get the data directory's path, where all data files, hooks and output files are
+    stored.
+
+    By default, the path is is ``$XDG_DATA_HOME/dotmix``, but it can be modified by
+    setting the environemt variable ``$DOTMIX_DATA_DIR``.
+
+    :return: Data path
+    """
+    env_vars = ["DOTMIX_DATA_DIR", ("XDG_DATA_HOME", True)]
+
+    return Path(get_path_from_env(env_vars))
+
+
+def get_config_dir() -> Path:
+    """Get the configuration directory's path, where the configuration is stored.
+
+    By default, the path is is ``$XDG_CONFIG_HOME/dotmix``, but it can be modified by
+    setting the environemt variable ``$DOTMIX_CONFIG_DIR``.
+
+    :return: Config path"""
+
+    env_vars = ["DOTMIX_CONFIG_DIR", ("XDG_CONFIG_HOME", True)]
+
+    return Path(get_path_from_env(env_vars))
+
+
+TOML_PARSER = "DOTMIX_TOML_PARSER"
+"""Environment variable name to choose the TOML parser"""
+
+TOML_PARSERS = ["tomllib", "tomli", "toml"]
+"""Modules that can be used to parse TOML, from the fastest to the slowest"""
+
+
+class TomlParser(NamedTuple):
+    """TOML parser backend
+
+    :param name: Name of the module
+    :param loads: Function that parses a TOML string
+    :param error: Exception raised for invalid TOML
+    """
+
+    name: str
+    loads: Callable[[str], Dict[str, Any]]
+    error: Type[Exception]
+
+
+@cache
+def get_toml_parser() -> TomlParser:
+    """Get the fastest TOML parser that is installed. ``tomllib`` is available since
+    Python 3.11, and ``tomli`` is the same parser for older versions. The parser can be
+    chosen by setting the environment variable ``$DOTMIX_TOML_PARSER`` to one of
+    :data:`TOML_PARSERS`.
+
+    :returns: TOML parser
+    """
+    name = os.getenv(TOML_PARSER)
+    if name and name not in TOML_PARSERS:
+        print_err(f"{TOML_PARSER} must be one of: {', '.join(TOML_PARSERS)}", True)
+
+    for module_name in [name] if name else TOML_PARSERS:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+
+        error = getattr(module, "TOMLDecodeError", None) or module.TomlDecodeError
+        return TomlParser(module_name, module.loads, error)
+
+    print_err(f"No TOML parser is installed ({name or ', '.join(TOML_PARSERS)})")
+    sys.exit(1)
+
+
 def load_toml_cfg(path: Path) -> Optional[Dict[str, Any]]:
-    """Load a TOML file into a dict
+    """Load a TOML file into a dict with the parser returned by
+    :func:`get_toml_parser`
 
     :param path: Path of the TOML file
 
     :returns: A dictionary with the parsed values if the file is found
     """
+    parser = get_toml_parser()
+
     fd = None
     cfg = None
 
     try:
         fd = path.open("r")
         content = fd.read()
-        cfg = toml.loads(content)
+        cfg = parser.loads(content)
 
         if not cfg:
             print_wrn(f"{path} exist but it's empty")
@@ -105,7 +197,7 @@ def load_toml_cfg(path: Path) -> Optional[Dict[str, Any]]:
     except PermissionError:
         print_err(f"Cannot access {path} due to wrong permissions", True)
 
-    except TomlDecodeError as e:
+    except parser.error as e:
         print_err(f"Invalid TOML syntax in {path}")
         raise (e)
 
@@ -116,7 +208,50 @@ def load_toml_cfg(path: Path) -> Optional[Dict[str, Any]]:
     return cfg
 
 
-BaseModelType = TypeVar("BaseModelType", bound=BaseModel)
+def read_toml_header(path: Path) -> str:
+    """Read the lines of a TOML file that come before its first table header.
+
+    :param path: Path of the TOML file
+
+    :returns: Lines before the first table
+    """
+    lines: List[str] = []
+
+    with path.open("r") as f:
+        for line in f:
+            if line.lstrip().startswith("["):
+                break
+            lines.append(line)
+
+    return "".join(lines)
+
+
+def load_toml_header(path: Path) -> Optional[Dict[str, Any]]:
+    """Load only the keys of a TOML file that come before its first table.
+
+    The file is read with :func:`read_toml_header`, so tables are not read nor
+    parsed. If the lines before that header can't be parsed on their own (for
+    instance, if a multiline value has a line that starts with ``[``), the whole file
+    is parsed with :func:`load_toml_cfg`.
+
+    :param path: Path of the TOML file
+
+    :returns: A dictionary with the parsed keys, or ``None`` if the file can't be read
+    """
+    parser = get_toml_parser()
+
+    try:
+        header = read_toml_header(path)
+    except OSError:
+        return None
+
+    try:
+        return parser.loads(header)
+    except parser.error:
+        return load_toml_cfg(path)
+
+
+BaseModelType = TypeVar("BaseModelType", bound="BaseModel")
 """Models that are submodels of pyantic's ``BaseModel``"""
 
 
@@ -129,6 +264,8 @@ def load_toml_cfg_model(path: Path, model: Type[BaseModelType]) -> BaseModelType
 
     :returns: Instance of the model
     """
+    from pydantic.error_wrappers import ValidationError
+
     model_instance = None
     cfg = load_toml_cfg(path)
     try:
@@ -157,6 +294,93 @@ def deep_merge(dict1: dict, dict2: dict) -> dict:
     return {k: _val(dict1.get(k), dict2.get(k)) for k in dict1.keys() | dict2.keys()}
 
 
+FICLONE = 0x40049409
+"""Linux ioctl request number to clone (reflink) a file"""
+
+_reflink_supported = sys.platform.startswith("linux")
+
+
+def clone_file(
+    src: Union[str, Path], dst: Union[str, Path], hardlink: bool = True
+) -> None:
+    """Make ``dst`` a copy of ``src`` without copying its data when possible.
+
+    The file is cloned with a reflink if the filesystem supports it (so both files
+    share data blocks until one of them is written), otherwise it's hardlinked. If
+    both files are not in the same filesystem, it's copied.
+
+    A hardlink is the same file, so writing ``src`` in place also modifies ``dst``.
+    It's only safe if files are always replaced (e.g. with
+    :func:`write_file_atomic`).
+
+    This function can be used as ``copy_function`` for :func:`shutil.copytree`
+
+    :param src: Source file
+    :param dst: Destination file
+    :param hardlink: If it's false, the file is copied instead of being hardlinked
+    """
+    global _reflink_supported
+
+    if _reflink_supported:
+        import fcntl
+
+        cloned = False
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            try:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+                cloned = True
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    # Don't try again, the filesystem doesn't support reflinks
+                    _reflink_supported = False
+
+        if cloned:
+            shutil.copystat(src, dst)
+            return
+
+        os.unlink(dst)
+
+    if hardlink:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+
+    shutil.copy2(src, dst)
+
+
+def write_file_atomic(path: Union[str, Path], data: bytes) -> None:
+    """Write a file atomically. The data is written to a temporary file in the same
+    directory which is then renamed to ``path``, so readers never see a partially
+    written file.
+
+    :param path: File to write
+    :param data: Content of the file
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def link_tree(src: Path, dst: Path, hardlink: bool = True) -> None:
+    """Recursively copy a directory cloning its files with :func:`clone_file`
+
+    :param src: Source directory
+    :param dst: Destination directory. It must not exist
+    :param hardlink: If it's false, files are copied instead of being hardlinked
+    """
+    shutil.copytree(src, dst, copy_function=partial(clone_file, hardlink=hardlink))
+
+
 def print_pair(lhs: str, rhs: str):
     """Pretty prints an arbitrary pair of values
 
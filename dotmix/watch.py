@@ -0,0 +1,468 @@
+"""Module for watching data files. It contains the file watchers used by the watch
+command, which renders the output files again every time a data file changes.
+
+On Linux, changes are received from inotify. On other platforms (or if inotify is not
+available), the watched directories are polled periodically.
+"""
+
+import ctypes
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from abc import ABCMeta, abstractmethod
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import click
+
+from dotmix.appearance import get_appearances_dir
+from dotmix.checksums import walk_files
+from dotmix.colorscheme import get_colorschemes_dir
+from dotmix.config import get_config_dir
+from dotmix.data import clear_data_caches
+from dotmix.fileset import IGNORE_FILE, VCS_DIRS, get_filesets_dir
+from dotmix.runner import apply, apply_changes
+from dotmix.typography import get_typographies_dir
+from dotmix.utils import print_err, print_verbose
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_ATTRIB
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+"""Inotify events that are watched"""
+
+EVENT_HEADER = struct.Struct("iIII")
+"""Layout of ``struct inotify_event`` without the name"""
+
+EVENT_BUFFER_SIZE = 64 * 1024
+"""Size in bytes of the buffer used to read inotify events"""
+
+POLL_INTERVAL = 0.25
+"""Time in seconds between scans of :class:`PollingWatcher`"""
+
+DEBOUNCE = 0.05
+"""Time in seconds without changes that is waited before rendering"""
+
+FileStat = Tuple[int, int, int]
+"""Modification time, size and inode of a file"""
+
+
+class Watcher(metaclass=ABCMeta):
+    """Base class for file watchers.
+
+    Watchers recursively watch directories and return the paths of the files
+    that changed.
+
+    :param paths: Directories to watch
+    """
+
+    paths: List[Path]
+
+    def __init__(self, paths: Iterable[Path]):
+        self.paths = list(paths)
+
+    @abstractmethod
+    def read(self, timeout: Optional[float] = None) -> Set[Path]:
+        """Wait for changes
+
+        :param timeout: Maximum time in seconds to wait. If it's None, this waits
+            until something changes
+        :returns: Paths that changed. It's empty if the timeout expired
+        """
+
+    def close(self) -> None:
+        """Stop watching and release resources"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def _get_libc() -> Optional[ctypes.CDLL]:
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return None
+
+    if not hasattr(libc, "inotify_init1"):
+        return None
+
+    return libc
+
+
+class InotifyWatcher(Watcher):
+    """File watcher that uses inotify. Every directory gets its own watch, and new
+    directories are watched as soon as they are created.
+
+    :param paths: Directories to watch
+    :raises OSError: If inotify is not available
+    """
+
+    _libc: ctypes.CDLL
+    _fd: int
+    _dirs: Dict[int, Path]
+
+    def __init__(self, paths: Iterable[Path]):
+        super().__init__(paths)
+
+        libc = _get_libc()
+        if not libc:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+
+        self._libc = libc
+        self._fd = fd
+        self._dirs = {}
+
+        for path in self.paths:
+            self._add_tree(path)
+
+    def _add_watch(self, dir: Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(code, os.strerror(code), str(dir))
+
+        self._dirs[wd] = dir
+
+    def _add_tree(self, dir: Path) -> None:
+        self._add_watch(dir)
+        for root, dirs, _ in os.walk(dir):
+            for d in dirs:
+                self._add_watch(Path(root) / d)
+
+    def read(self, timeout: Optional[float] = None) -> Set[Path]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        try:
+            data = os.read(self._fd, EVENT_BUFFER_SIZE)
+        except BlockingIOError:
+            return set()
+
+        changed: Set[Path] = set()
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, so everything could have changed
+                changed.update(self.paths)
+                continue
+
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+
+            dir = self._dirs.get(wd)
+            if dir is None:
+                continue
+
+            path = dir / name if name else dir
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # Files may be created before the new directory is watched
+                self._add_tree(path)
+                changed.update(path / p for p, _ in walk_files(path))
+
+            changed.add(path)
+
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher(Watcher):
+    """File watcher that periodically compares the stat of the watched files.
+
+    :param paths: Directories to watch
+    :param interval: Time in seconds between scans
+    """
+
+    interval: float
+    _snapshot: Dict[Path, FileStat]
+
+    def __init__(self, paths: Iterable[Path], interval: float = POLL_INTERVAL):
+        super().__init__(paths)
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[Path, FileStat]:
+        snapshot: Dict[Path, FileStat] = {}
+
+        for path in self.paths:
+            for relative_path, stat in walk_files(path):
+                snapshot[path / relative_path] = (
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                    stat.st_ino,
+                )
+
+        return snapshot
+
+    def read(self, timeout: Optional[float] = None) -> Set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            wait = self.interval
+            if deadline is not None:
+                wait = max(min(wait, deadline - time.monotonic()), 0)
+            time.sleep(wait)
+
+            snapshot = self._scan()
+            changed = {
+                path
+                for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+
+def get_watcher(paths: Iterable[Path], poll: bool = False) -> Watcher:
+    """Create the best file watcher available
+
+    :param paths: Directories to watch
+    :param poll: Flag to use :class:`PollingWatcher` even if inotify is available
+    :returns: File watcher
+    """
+    paths = list(paths)
+
+    if not poll:
+        try:
+            return InotifyWatcher(paths)
+        except OSError as e:
+            print_verbose(f"Can't use inotify ({e}), falling back to polling")
+
+    return PollingWatcher(paths)
+
+
+def read_changes(watcher: Watcher, debounce: float = DEBOUNCE) -> Set[Path]:
+    """Wait for changes and collect them until nothing changes for ``debounce``
+    seconds, so a burst of events (e.g. an editor saving a file) is handled once.
+
+    :param watcher: File watcher
+    :param debounce: Time in seconds without changes to wait
+    :returns: Paths that changed
+    """
+    changed = watcher.read()
+
+    while True:
+        more = watcher.read(debounce)
+        if not more:
+            return changed
+        changed |= more
+
+
+def _stat_file(path: Path) -> Optional[FileStat]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def get_changed_categories(changed: Iterable[Path], templates: Set[Path]) -> Set[str]:
+    """Get the data categories whose cached data is outdated after some paths
+    changed.
+
+    Data files are cached by category, so a data file that changed outdates its
+    whole category. Filesets are only outdated if their files changed (i.e. a
+    template was added or removed, or a ``settings.toml`` or ignore file changed),
+    since templates are read when they are rendered.
+
+    :param changed: Paths that changed
+    :param templates: Templates of the filesets before the changes. It's updated
+        with the templates that were added or removed
+    :returns: Names of the data directories of the outdated categories
+    """
+    filesets_dir = get_filesets_dir()
+    data_dirs = [get_colorschemes_dir(), get_typographies_dir(), get_appearances_dir()]
+    categories: Set[str] = set()
+
+    for path in changed:
+        for dir in data_dirs:
+            if path.is_relative_to(dir):
+                categories.add(dir.name)
+
+        if not path.is_relative_to(filesets_dir):
+            continue
+
+        is_template = path.is_file() and path.name not in ("settings.toml", IGNORE_FILE)
+        if is_template and path in templates:
+            continue
+
+        categories.add(filesets_dir.name)
+        if is_template:
+            templates.add(path)
+        else:
+            templates.discard(path)
+            if not path.exists():
+                # A directory may have been removed with its files
+                templates.difference_update(
+                    [t for t in templates if t.is_relative_to(path)]
+                )
+
+    return categories
+
+
+def watch(
+    *,
+    colorscheme_id: Optional[str] = None,
+    fileset_id: Optional[str] = None,
+    appearance_id: Optional[str] = None,
+    typography_id: Optional[str] = None,
+    pre_hook: Optional[str] = None,
+    post_hook: Optional[str] = None,
+    use_defaults: bool = True,
+    force: bool = False,
+    poll: bool = False,
+    debounce: float = DEBOUNCE,
+) -> None:
+    """Render the output files and render them again every time a data file, a
+    template or the configuration changes. This runs until it's interrupted.
+
+    The output files are rendered with :func:`dotmix.runner.apply` once, and then
+    only the caches of the data categories that changed are cleared (see
+    :func:`get_changed_categories`) and the output files are updated in place with
+    :func:`dotmix.runner.apply_changes`, which only renders the files whose template
+    or variables changed. If the configuration changes, everything is rendered with
+    :func:`dotmix.runner.apply` again.
+
+    The parameters are the same as :func:`dotmix.runner.apply`, and:
+
+    :param poll: Flag to poll the data directories even if inotify is available
+    :param debounce: Time in seconds without changes to wait before rendering
+    """
+
+    config_file = get_config_dir() / "config.toml"
+    filesets_dir = get_filesets_dir()
+    data_dirs = [get_colorschemes_dir(), get_typographies_dir(), get_appearances_dir()]
+    ids = {
+        "colorscheme_id": colorscheme_id,
+        "fileset_id": fileset_id,
+        "appearance_id": appearance_id,
+        "typography_id": typography_id,
+        "post_hook": post_hook,
+        "use_defaults": use_defaults,
+    }
+
+    def run(func: Callable[[], Any]) -> Tuple[bool, Any]:
+        start = time.perf_counter()
+        try:
+            result = func()
+        except SystemExit:
+            # Errors were already printed
+            return False, None
+        except Exception as e:
+            print_err(f"Rendering failed: {e}")
+            return False, None
+
+        elapsed = (time.perf_counter() - start) * 1000
+        print_verbose(f"Rendered in {elapsed:.1f}ms")
+        return True, result
+
+    def render() -> Optional[FileStat]:
+        clear_data_caches()
+        run(
+            partial(
+                apply,
+                **ids,
+                pre_hook=pre_hook,
+                force=force,
+                interactive=False,
+                incremental=True,
+            )
+        )
+
+        # apply() stores the current theme in the configuration, so the change
+        # made by this process is ignored
+        return _stat_file(config_file)
+
+    def update(changed: Set[Path]) -> Optional[FileStat]:
+        for category in get_changed_categories(changed, templates):
+            print_verbose(f"Clearing cached {category}")
+            clear_data_caches(category)
+
+        ok, files = run(partial(apply_changes, **ids))
+        if ok and files is None:
+            # There are no output files to update
+            return render()
+
+        for relative_path in files or []:
+            print_verbose(f"Updated: {relative_path}")
+
+        return _stat_file(config_file)
+
+    with get_watcher([filesets_dir, *data_dirs, get_config_dir()], poll) as watcher:
+        templates = {filesets_dir / p for p, _ in walk_files(filesets_dir)}
+        config_stat = render()
+        click.secho("Watching for changes. Press Ctrl+C to stop", bold=True)
+
+        while True:
+            changed = read_changes(watcher, debounce)
+
+            config_changed = config_file in changed
+            if config_changed:
+                stat = _stat_file(config_file)
+                config_changed = stat != config_stat
+
+            changed = {
+                path
+                for path in changed
+                if any(path.is_relative_to(dir) for dir in [filesets_dir, *data_dirs])
+                and not VCS_DIRS.intersection(path.parts)
+            }
+
+            if not (config_changed or changed):
+                continue
+
+            for path in sorted(changed):
+                print_verbose(f"Changed: {path}")
+
+            click.echo("")
+            if config_changed:
+                config_stat = render()
+            else:
+                config_stat = update(changed)
@@ -0,0 +1,67 @@
+import hashlib
+import os
+
+import pytest
+
+from dotmix.checksums import (
+    diff_manifest,
+    get_checksums_file,
+    hash_file,
+    make_entry,
+    read_manifest,
+    walk_files,
+    write_manifest,
+)
+
+
+@pytest.mark.parametrize("algorithm", ["sha256", "blake2b"])
+def test_hash_file(tmp_path, algorithm):
+    file = tmp_path / "file"
+    content = os.urandom(3 * 1024 * 1024 + 7)
+    file.write_bytes(content)
+
+    assert hash_file(file, algorithm) == hashlib.new(algorithm, content).hexdigest()
+
+
+def test_diff_manifest(tmp_path):
+    for name in ["same", "touched", "modified", "removed"]:
+        (tmp_path / name).write_text(name)
+
+    manifest = {
+        "version": 1,
+        "algorithm": "sha256",
+        "written_ns": 2**63,
+        "files": {
+            path: make_entry(stat, hash_file(tmp_path / path))
+            for path, stat in walk_files(tmp_path)
+        },
+    }
+
+    os.utime(tmp_path / "touched", ns=(0, 0))
+    (tmp_path / "modified").write_text("MODIFIED")
+    (tmp_path / "removed").unlink()
+    (tmp_path / "added").write_text("added")
+
+    assert diff_manifest(tmp_path, manifest) == (["added"], ["modified"], ["removed"])
+
+
+def test_files_modified_with_the_manifest_are_hashed(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOTMIX_DATA_DIR", str(tmp_path))
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    file = out_dir / "file"
+    file.write_text("before")
+
+    # The file is modified in the same timestamp tick as the manifest is written
+    write_manifest({})
+    written_ns = get_checksums_file().stat().st_mtime_ns
+    os.utime(file, ns=(written_ns, written_ns))
+    write_manifest({"file": make_entry(file.stat(), hash_file(file))})
+    os.utime(get_checksums_file(), ns=(written_ns, written_ns))
+
+    file.write_text("after!")
+    os.utime(file, ns=(written_ns, written_ns))
+
+    manifest = read_manifest()
+    assert manifest["written_ns"] == written_ns
+    assert diff_manifest(out_dir, manifest) == ([], ["file"], [])
@@ -0,0 +1,49 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ["chevron", "colp", "pydantic", "toml", "dotmix.runner"]
+
+SCRIPT = """
+import json, sys
+from dotmix.cli import cli
+try:
+    cli.main(sys.argv[1:], prog_name="dotmix")
+except SystemExit:
+    pass
+print(json.dumps(sorted(sys.modules)), file=sys.stderr)
+"""
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    (tmp_path / "colorschemes").mkdir()
+    (tmp_path / "colorschemes" / "dark.toml").write_text('name = "Dark"\n')
+    (tmp_path / "filesets" / "base").mkdir(parents=True)
+    (tmp_path / "filesets" / "base" / "settings.toml").write_text('name = "Base"\n')
+
+    monkeypatch.setenv("DOTMIX_DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "args,allowed",
+    [
+        (["--help"], []),
+        (["apply", "--help"], []),
+        (["colorscheme", "--help"], []),
+        (["fileset", "list"], ["pydantic", "toml"]),
+        (["colorscheme", "list"], ["colp", "pydantic", "toml"]),
+    ],
+)
+def test_cli_imports_only_needed_modules(data_dir, args, allowed):
+    p = subprocess.run(
+        [sys.executable, "-c", SCRIPT, *args], capture_output=True, text=True
+    )
+    modules = json.loads(p.stderr.splitlines()[-1])
+
+    for heavy in HEAVY_MODULES:
+        if heavy not in allowed:
+            assert heavy not in modules, f"dotmix {' '.join(args)} imported {heavy}"
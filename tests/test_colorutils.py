@@ -0,0 +1,53 @@
+import random
+
+from dotmix.colorutils import (
+    clear_color_caches,
+    get_color_cache_info,
+    make_alt_color,
+    make_average_color,
+    make_brown_from_orange,
+    make_orange_from_yellow,
+    normalize,
+)
+from dotmix.vendor.colp import HEX, RGB
+
+rng = random.Random(0)
+COLORS = [
+    *(f"#{rng.randrange(0x1000000):06x}" for _ in range(500)),
+    *(f"{rng.randrange(0x1000):03x}" for _ in range(100)),
+    *(f"#{i:02x}{i:02x}{i:02x}" for i in range(0, 256, 5)),
+]
+
+
+def colp_alt_color(color, inverse=False):
+    c = HEX(color)
+    if (c.brightness() > 0.5) != inverse:
+        return str(c.darker(1.25))
+    return str(c.darker(0.75))
+
+
+def colp_average_color(color1, color2):
+    a, b = HEX(color1), HEX(color2)
+    return str(RGB((a.r + b.r) / 2, (a.g + b.g) / 2, (a.b + b.b) / 2).to(HEX))
+
+
+def test_colors_are_identical_to_colp():
+    for color, other in zip(COLORS, reversed(COLORS)):
+        assert normalize(color) == str(HEX(color))
+        assert make_alt_color(color) == colp_alt_color(color)
+        assert make_alt_color(color, inverse=True) == colp_alt_color(color, True)
+        assert make_orange_from_yellow(color) == str(HEX(color).rotate(-15))
+        assert make_brown_from_orange(color) == str(HEX(color).rotate(-10).darker(1.1))
+        assert make_average_color(color, other) == colp_average_color(color, other)
+
+
+def test_color_functions_are_cached():
+    clear_color_caches()
+
+    for _ in range(3):
+        make_alt_color("#81a2be")
+
+    info = get_color_cache_info()
+    assert info["make_alt_color"].hits == 2
+    assert info["make_alt_color"].misses == 1
+    assert info["parse_hex"].misses == 1
@@ -0,0 +1,31 @@
+import os
+
+from dotmix.cli.completion import ColorschemeType, get_completion_index
+
+
+def test_completion_index_is_updated_when_the_directory_changes(
+    tmp_path, monkeypatch, capfd
+):
+    colorschemes_dir = tmp_path / "colorschemes"
+    colorschemes_dir.mkdir()
+    (colorschemes_dir / "dark.toml").write_text('name = "Dark"\n')
+    (colorschemes_dir / "invalid.toml").write_text("name = \n")
+    monkeypatch.setenv("DOTMIX_DATA_DIR", str(tmp_path))
+
+    entries = get_completion_index("colorschemes")
+    assert {id: e["name"] for id, e in entries.items()} == {"dark": "Dark"}
+    # Invalid files are skipped without printing errors
+    assert capfd.readouterr().err == ""
+
+    # The index is used as long as the directory doesn't change
+    stat = colorschemes_dir.stat()
+    (colorschemes_dir / "dark.toml").write_text('name = "Renamed"\n')
+    os.utime(colorschemes_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert get_completion_index("colorschemes")["dark"]["name"] == "Dark"
+
+    (colorschemes_dir / "light.toml").write_text('name = "Light"\n')
+    items = ColorschemeType().shell_complete(None, None, "")
+    assert [(i.value, i.help) for i in items] == [
+        ("dark", "Renamed"),
+        ("light", "Light"),
+    ]
@@ -0,0 +1,26 @@
+from dotmix.config import (
+    create_config,
+    get_config,
+    get_current_theme,
+    set_current_theme,
+)
+
+
+def test_config_is_cached_until_it_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOTMIX_CONFIG_DIR", str(tmp_path))
+    create_config(tmp_path, tmp_path / "data")
+    config_file = tmp_path / "config.toml"
+
+    cfg = get_config()
+    assert get_config() is cfg
+
+    set_current_theme("a", "t", "c", "f", None, None)
+    assert get_current_theme().colorscheme == "c"
+    assert cfg.current is None
+
+    stat = config_file.stat()
+    set_current_theme("a", "t", "c", "f", None, None)
+    assert config_file.stat().st_ino == stat.st_ino
+
+    config_file.write_text(config_file.read_text().replace('"c"', '"other"'))
+    assert get_current_theme().colorscheme == "other"
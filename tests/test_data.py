@@ -0,0 +1,106 @@
+from pathlib import Path
+
+import pytest
+
+from dotmix.data import DataFilesDict, ExtendsGraph
+
+
+def make_files(extends) -> DataFilesDict:
+    return {
+        id: {"id": id, "name": id.title(), "path": Path(id), "extends": parent}
+        for id, parent in extends.items()
+    }
+
+
+def test_extends_graph_ancestors():
+    graph = ExtendsGraph(
+        make_files({"base": None, "dark": "base", "darker": "dark", "lost": "none"})
+    )
+
+    assert graph.get_ancestors("darker") == ["dark", "base"]
+    assert graph.get_ancestors("dark") == ["base"]
+    assert graph.get_ancestors("base") == []
+    assert graph.get_ancestors("lost") == []
+
+
+def test_extends_graph_cycle():
+    graph = ExtendsGraph(make_files({"a": "b", "b": "c", "c": "a"}))
+
+    with pytest.raises(SystemExit):
+        graph.get_ancestors("a")
+
+
+def test_typography_data_is_merged_with_parents(tmp_path, monkeypatch):
+    from dotmix.data import clear_data_caches
+    from dotmix.typography import get_typography_by_id, resolve_typographies
+
+    typographies_dir = tmp_path / "typographies"
+    typographies_dir.mkdir()
+    (typographies_dir / "base.toml").write_text(
+        'name = "Base"\n[custom]\nfont = "Iosevka"\nsize = "11"\n'
+    )
+    (typographies_dir / "big.toml").write_text(
+        'name = "Big"\nextends = "base"\n[custom]\nsize = "14"\n'
+    )
+    (typographies_dir / "same.toml").write_text('name = "Same"\nextends = "big"\n')
+    monkeypatch.setenv("DOTMIX_DATA_DIR", str(tmp_path))
+    clear_data_caches()
+
+    assert get_typography_by_id("big").data.dict() == {"font": "Iosevka", "size": "14"}
+    assert get_typography_by_id("same").data.dict() == {"font": "Iosevka", "size": "14"}
+    assert {id: r["parents"] for id, r in resolve_typographies().items()} == {
+        "base": [],
+        "big": ["base"],
+        "same": ["big", "base"],
+    }
+
+    clear_data_caches()
+
+
+def test_extends_graph_order():
+    graph = ExtendsGraph(
+        make_files({"darker": "dark", "dark": "base", "light": "base", "base": None})
+    )
+    order = graph.get_order()
+
+    assert order.index("base") < order.index("dark") < order.index("darker")
+    assert order.index("base") < order.index("light")
+
+
+def test_data_cache(tmp_path, monkeypatch):
+    from dotmix import datacache
+    from dotmix.data import DataFileModel
+
+    monkeypatch.setenv("DOTMIX_DATA_DIR", str(tmp_path))
+    path = tmp_path / "dark.toml"
+    path.write_text('name = "Dark"\n')
+
+    assert datacache.load_data_cfg_model(path, DataFileModel).name == "Dark"
+
+    def fail(*args):
+        raise AssertionError("Data file was parsed again")
+
+    with monkeypatch.context() as m:
+        m.setattr(datacache, "load_toml_cfg_model", fail)
+        assert datacache.load_data_cfg_model(path, DataFileModel).name == "Dark"
+
+    path.write_text('name = "Darker"\n')
+    assert datacache.load_data_cfg_model(path, DataFileModel).name == "Darker"
+
+
+def test_data_files_are_listed_from_their_header(tmp_path):
+    from dotmix.data import get_data_files
+
+    (tmp_path / "dark.toml").write_text(
+        'name = "Dark"\nextends = "base"\n[colors]\ninvalid =\n'
+    )
+    (tmp_path / "multiline.toml").write_text(
+        'name = "Multiline"\nlist = [\n  ["a"],\n]\n[custom]\nkey = "value"\n'
+    )
+    (tmp_path / "backup.toml.bak").write_text('name = "Backup"\n')
+
+    files = get_data_files.__wrapped__(tmp_path)
+
+    assert sorted(files) == ["dark", "multiline"]
+    assert files["dark"]["extends"] == "base"
+    assert files["multiline"]["name"] == "Multiline"
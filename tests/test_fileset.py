@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import pytest
+
+from dotmix.fileset import Fileset, get_paths_from_fileset, is_ignored
+
+
+@pytest.mark.parametrize(
+    "path,is_dir,ignored",
+    [
+        ("config/.git", True, True),
+        ("config/app.conf", False, False),
+        ("config/app.conf.bak", False, True),
+        ("config/build", True, True),
+        ("build", False, False),
+        ("assets/images", True, True),
+        ("config/assets/images", True, False),
+    ],
+)
+def test_is_ignored(path, is_dir, ignored):
+    patterns = ["*.bak", "build/", "/assets/images"]
+
+    assert is_ignored(path, is_dir, patterns) == ignored
+
+
+def test_get_paths_from_fileset(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOTMIX_DATA_DIR", str(tmp_path))
+    dir = tmp_path / "filesets" / "base"
+    for path in ["config/app.conf", "config/.git/HEAD", "config/app.bak", "readme"]:
+        (dir / path).parent.mkdir(parents=True, exist_ok=True)
+        (dir / path).write_text("")
+    (dir / "settings.toml").write_text('name = "Base"\n')
+    (dir / ".dotmixignore").write_text("# Backups\n*.bak\n")
+    fileset = Fileset("base", "Base", dir / "settings.toml")
+
+    assert sorted(get_paths_from_fileset(fileset)) == ["config/app.conf"]
+
+    (dir / "config" / "nested").mkdir()
+    (dir / "config" / "nested" / "new.conf").write_text("")
+    (dir / ".dotmixignore").write_text("")
+
+    assert sorted(get_paths_from_fileset(fileset)) == [
+        "config/app.bak",
+        "config/app.conf",
+        "config/nested/new.conf",
+    ]
+    assert Path(tmp_path / ".cache" / "filesets" / "base.json").exists()
@@ -0,0 +1,227 @@
+from pathlib import Path
+
+import pytest
+
+from dotmix.checksums import get_checksums_file
+from dotmix.config import create_config
+from dotmix.data import clear_data_caches
+from dotmix.fileset import get_fileset_by_id
+from dotmix.profiling import Profiler
+from dotmix.runner import (
+    apply,
+    apply_changes,
+    check_fileset_changes,
+    get_out_backup_dir,
+    get_out_dir,
+    render_fileset,
+)
+
+VARS = {"colors": {"red": "#FF0000"}, "typography": {"font": "Iosevka"}}
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    fileset_dir = tmp_path / "filesets" / "base"
+    (fileset_dir / "cfg" / "nested").mkdir(parents=True)
+    (fileset_dir / "settings.toml").write_text('name = "Base"\n')
+
+    for i in range(20):
+        (fileset_dir / "cfg" / f"{i}.conf").write_text(f"{i} {{{{colors.red}}}}\n")
+    (fileset_dir / "cfg" / "nested" / "font").write_text("{{typography.font}}\n")
+
+    monkeypatch.setenv("DOTMIX_DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+def read_tree(dir: Path):
+    return {
+        str(p.relative_to(dir)): p.read_text() for p in dir.rglob("*") if p.is_file()
+    }
+
+
+def test_render_fileset_is_the_same_for_every_backend(data_dir, tmp_path):
+    fileset = get_fileset_by_id("base")
+
+    serial_dir = tmp_path / "serial"
+    render_fileset(fileset, str(serial_dir), VARS, jobs=1)
+    expected = read_tree(serial_dir)
+
+    assert expected["cfg/3.conf"] == "3 #FF0000\n"
+    assert expected["cfg/nested/font"] == "Iosevka\n"
+
+    for backend in ["thread", "process"]:
+        out_dir = tmp_path / backend
+        render_fileset(fileset, str(out_dir), VARS, jobs=4, backend=backend)
+        assert read_tree(out_dir) == expected
+
+
+def test_render_fileset_records_file_timings(data_dir, tmp_path):
+    profiler = Profiler()
+    fileset = get_fileset_by_id("base")
+
+    with profiler.phase("render"):
+        render_fileset(fileset, str(tmp_path / "out"), VARS, jobs=2, profiler=profiler)
+
+    assert set(profiler.files) == set(fileset.data)
+    assert profiler.total == profiler.phases["render"]
+    assert (
+        profiler.phases["render"].wall
+        >= sum(t.wall for t in profiler.files.values()) / 2
+    )
+
+
+@pytest.fixture
+def config_dir(data_dir, monkeypatch):
+    config_dir = data_dir / "config"
+    monkeypatch.setenv("DOTMIX_CONFIG_DIR", str(config_dir))
+    create_config(config_dir, data_dir)
+    return config_dir
+
+
+def run_apply(**kwargs):
+    clear_data_caches()
+    apply(fileset_id="base", use_defaults=False, **kwargs)
+
+
+def test_backup_is_only_made_without_a_manifest(config_dir, monkeypatch):
+    run_apply()
+    assert get_checksums_file().exists()
+    assert not get_out_backup_dir().exists()
+
+    def write_checksums(*args):
+        raise OSError("read-only filesystem")
+
+    monkeypatch.setattr("dotmix.runner.write_checksums", write_checksums)
+    get_checksums_file().unlink()
+    run_apply()
+
+    out_file = get_out_dir() / "cfg" / "7.conf"
+    backup_file = get_out_backup_dir() / "cfg" / "7.conf"
+    assert out_file.stat().st_ino != backup_file.stat().st_ino
+
+    with out_file.open("a") as f:
+        f.write("edited\n")
+
+    assert backup_file.read_text() == "7 \n"
+    assert check_fileset_changes(get_out_dir()) == ([], ["cfg/7.conf"], [])
+
+
+def test_incremental_apply_only_renders_changed_templates(
+    data_dir, config_dir, monkeypatch
+):
+    # Reflinks would give reused files a new inode
+    monkeypatch.setattr("dotmix.utils._reflink_supported", False)
+    template = data_dir / "filesets" / "base" / "cfg" / "3.conf"
+
+    run_apply(incremental=True)
+    inodes = {p: p.stat().st_ino for p in get_out_dir().rglob("*") if p.is_file()}
+
+    template.write_text("edited {{colors.red}}\n")
+    profiler = Profiler()
+    run_apply(incremental=True, profiler=profiler)
+
+    assert set(profiler.files) == {"cfg/3.conf"}
+    assert (get_out_dir() / "cfg" / "3.conf").read_text() == "edited \n"
+    for path, inode in inodes.items():
+        if path.name != "3.conf":
+            assert path.stat().st_ino == inode
+
+
+def test_force_renders_modified_files_again(config_dir):
+    run_apply(incremental=True)
+    out_file = get_out_dir() / "cfg" / "5.conf"
+    out_file.write_text("edited\n")
+
+    with pytest.raises(SystemExit):
+        run_apply(incremental=True)
+    assert out_file.read_text() == "edited\n"
+
+    run_apply(incremental=True, force=True)
+    assert out_file.read_text() == "5 \n"
+    assert check_fileset_changes(get_out_dir()) is None
+
+
+@pytest.mark.parametrize("output_mode", ["swap", "update"])
+def test_failing_post_hook_restores_previous_output(
+    data_dir, config_dir, monkeypatch, output_mode
+):
+    hook = data_dir / "hooks" / "fail"
+    hook.parent.mkdir()
+    hook.write_text("#!/bin/sh\nexit 1\n")
+    hook.chmod(0o755)
+    monkeypatch.setattr("click.confirm", lambda *args, **kwargs: True)
+
+    run_apply(output_mode=output_mode)
+    expected = read_tree(get_out_dir())
+
+    (data_dir / "filesets" / "base" / "cfg" / "3.conf").write_text("edited\n")
+    with pytest.raises(SystemExit):
+        run_apply(post_hook="fail", output_mode=output_mode)
+
+    assert read_tree(get_out_dir()) == expected
+    assert check_fileset_changes(get_out_dir()) is None
+
+
+def test_update_mode_only_writes_changed_files(data_dir, config_dir):
+    fileset_dir = data_dir / "filesets" / "base"
+
+    run_apply(output_mode="update")
+    stats = {p: p.stat() for p in get_out_dir().rglob("*") if p.is_file()}
+
+    (fileset_dir / "cfg" / "3.conf").write_text("edited\n")
+    (fileset_dir / "cfg" / "4.conf").unlink()
+    run_apply(output_mode="update")
+
+    assert (get_out_dir() / "cfg" / "3.conf").read_text() == "edited\n"
+    assert not (get_out_dir() / "cfg" / "4.conf").exists()
+    for path, stat in stats.items():
+        if path.name not in ("3.conf", "4.conf"):
+            assert path.stat().st_ino == stat.st_ino
+            assert path.stat().st_mtime_ns == stat.st_mtime_ns
+    assert check_fileset_changes(get_out_dir()) is None
+
+
+@pytest.mark.parametrize("output_mode", ["swap", "update"])
+def test_post_hook_that_modifies_files_in_place_is_reverted(
+    data_dir, config_dir, monkeypatch, output_mode
+):
+    hook = data_dir / "hooks" / "fail"
+    hook.parent.mkdir()
+    hook.write_text('#!/bin/sh\necho edited >> "$DOTMIX_OUT/cfg/7.conf"\nexit 1\n')
+    hook.chmod(0o755)
+    monkeypatch.setattr("click.confirm", lambda *args, **kwargs: True)
+    # Reflinks would copy the unchanged files instead of linking them
+    monkeypatch.setattr("dotmix.utils._reflink_supported", False)
+
+    run_apply(output_mode=output_mode, incremental=True)
+    expected = read_tree(get_out_dir())
+
+    (data_dir / "filesets" / "base" / "cfg" / "3.conf").write_text("edited\n")
+    with pytest.raises(SystemExit):
+        run_apply(post_hook="fail", output_mode=output_mode, incremental=True)
+
+    assert read_tree(get_out_dir()) == expected
+    assert check_fileset_changes(get_out_dir()) is None
+
+
+def test_apply_changes_only_writes_affected_files(data_dir, config_dir):
+    fileset_dir = data_dir / "filesets" / "base"
+    assert apply_changes(fileset_id="base", use_defaults=False) is None
+
+    run_apply(incremental=True)
+    stats = {p: p.stat() for p in get_out_dir().rglob("*") if p.is_file()}
+
+    (fileset_dir / "cfg" / "3.conf").write_text("edited {{colors.red}}\n")
+    assert apply_changes(fileset_id="base", use_defaults=False) == ["cfg/3.conf"]
+
+    (fileset_dir / "cfg" / "4.conf").unlink()
+    clear_data_caches("filesets")
+    assert apply_changes(fileset_id="base", use_defaults=False) == ["cfg/4.conf"]
+
+    assert (get_out_dir() / "cfg" / "3.conf").read_text() == "edited \n"
+    assert not (get_out_dir() / "cfg" / "4.conf").exists()
+    for path, stat in stats.items():
+        if path.name not in ("3.conf", "4.conf"):
+            assert path.stat().st_ino == stat.st_ino
+            assert path.stat().st_mtime_ns == stat.st_mtime_ns
+    assert check_fileset_changes(get_out_dir()) is None
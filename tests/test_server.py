@@ -0,0 +1,117 @@
+import os
+import threading
+
+from dotmix.client import connect, run
+from dotmix.server import Server
+
+
+def test_server_runs_commands_and_reloads_data(tmp_path, monkeypatch, capfd):
+    colorschemes_dir = tmp_path / "colorschemes"
+    colorschemes_dir.mkdir()
+    (colorschemes_dir / "dark.toml").write_text('name = "Dark"\n')
+    monkeypatch.setenv("DOTMIX_DATA_DIR", str(tmp_path))
+
+    server = Server(str(tmp_path / "dotmix.sock"))
+
+    threading.Thread(target=server.serve, daemon=True).start()
+    while not (sock := connect(server.path)):
+        pass
+    sock.close()
+
+    with connect(server.path) as sock:
+        assert run(sock, ["colorscheme", "list"]) == 0
+    assert "Dark (dark)" in capfd.readouterr().out
+
+    (colorschemes_dir / "light.toml").write_text('name = "Light"\n')
+    with connect(server.path) as sock:
+        assert run(sock, ["colorscheme", "list"]) == 0
+    assert "Light (light)" in capfd.readouterr().out
+
+    with connect(server.path) as sock:
+        assert run(sock, ["colorscheme", "nope"]) == 2
+
+
+def test_server_clears_data_when_colormode_changes(tmp_path, monkeypatch):
+    from dotmix.colorscheme import get_colorscheme_by_id
+    from dotmix.config import create_config
+
+    base16 = "\n".join(f'base0{i:X} = "#{i:02x}{i:02x}{i:02x}"' for i in range(16))
+    terminal = "\n".join(f'color{i} = "#{i:02x}0000"' for i in range(16))
+    terminal += '\nbg = "#000000"\nfg = "#ffffff"'
+    colorschemes_dir = tmp_path / "colorschemes"
+    colorschemes_dir.mkdir()
+    (colorschemes_dir / "dark.toml").write_text(
+        f'name = "Dark"\n[colors.base16]\n{base16}\n[colors.terminal]\n{terminal}\n'
+    )
+    monkeypatch.setenv("DOTMIX_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("DOTMIX_CONFIG_DIR", str(tmp_path))
+    monkeypatch.delenv("DOTMIX_COLORMODE", raising=False)
+    create_config(tmp_path, tmp_path)
+    config_file = tmp_path / "config.toml"
+
+    server = Server(str(tmp_path / "dotmix.sock"))
+
+    server._refresh_caches()
+    assert get_colorscheme_by_id("dark").data["colors"].red == "#080808"
+
+    config_file.write_text(config_file.read_text().replace("base16", "terminal"))
+    server._refresh_caches()
+    assert get_colorscheme_by_id("dark").data["colors"].red == "#010000"
+
+    monkeypatch.setenv("DOTMIX_COLORMODE", "base16")
+    server._refresh_caches()
+    assert get_colorscheme_by_id("dark").data["colors"].red == "#080808"
+
+
+def test_server_of_another_user_is_refused(tmp_path, monkeypatch, capfd):
+    server = Server(str(tmp_path / "dotmix.sock"))
+
+    threading.Thread(target=server.serve, daemon=True).start()
+    while not (sock := connect(server.path)):
+        pass
+    sock.close()
+
+    uid = os.getuid()
+    monkeypatch.setattr(os, "getuid", lambda: uid + 1)
+    assert connect(server.path) is None
+    assert "run by another user" in capfd.readouterr().err
+
+
+def test_fallback_socket_dir_must_be_private(tmp_path, monkeypatch):
+    from dotmix.client import get_socket_path, is_private_dir
+
+    monkeypatch.delenv("DOTMIX_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(
+        "dotmix.client.get_fallback_socket_dir", lambda: str(tmp_path / "dotmix")
+    )
+    monkeypatch.setattr(
+        "dotmix.server.get_fallback_socket_dir", lambda: str(tmp_path / "dotmix")
+    )
+
+    server = Server()
+    assert server.path == get_socket_path() == str(tmp_path / "dotmix" / "dotmix.sock")
+
+    threading.Thread(target=server.serve, daemon=True).start()
+    while not (sock := connect()):
+        pass
+    sock.close()
+    assert is_private_dir(str(tmp_path / "dotmix"))
+
+    (tmp_path / "dotmix").chmod(0o755)
+    assert connect() is None
+
+
+def test_server_answers_help_without_data_dir(tmp_path, monkeypatch, capfd):
+    monkeypatch.delenv("DOTMIX_DATA_DIR", raising=False)
+    monkeypatch.delenv("XDG_DATA_HOME", raising=False)
+    server = Server(str(tmp_path / "dotmix.sock"))
+
+    threading.Thread(target=server.serve, daemon=True).start()
+    while not (sock := connect(server.path)):
+        pass
+    sock.close()
+
+    with connect(server.path) as sock:
+        assert run(sock, ["colorscheme", "--help"]) == 0
+    assert "Manage colorschemes" in capfd.readouterr().out
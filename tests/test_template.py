@@ -0,0 +1,113 @@
+import itertools
+import os
+from types import SimpleNamespace
+
+from chevron.tokenizer import tokenize
+
+from dotmix.template import (
+    MISSING_KEY,
+    USED_RESOLUTION,
+    TemplateCache,
+    compile_template,
+    get_dependency_values,
+    scan_dependencies,
+)
+
+
+def test_scan_dependencies():
+    template = (
+        "{{typography.font}} {{{appearance.gtk}}}\n"
+        "{{#colors}}{{fg}}{{/colors}}{{^custom.dark}}light{{/custom.dark}}\n"
+        "{{> header}}{{! comment }}"
+    )
+
+    keys, partials = scan_dependencies(tokenize(template))
+
+    assert keys == ["appearance.gtk", "colors", "custom.dark", "fg", "typography.font"]
+    assert partials == ["header"]
+
+
+def test_get_dependency_values():
+    vars = {"colors": {"red": "#FF0000"}, "fonts": ["Iosevka", "Inter"]}
+
+    values = get_dependency_values(vars, ["colors.red", "colors.blue", "fonts.1"])
+
+    assert values == {
+        "colors.red": "#FF0000",
+        "colors.blue": MISSING_KEY,
+        "fonts.1": "Inter",
+    }
+
+
+def test_template_cache_invalidation(tmp_path):
+    template = tmp_path / "template"
+    template.write_text("{{colors.red}}\n")
+    cache = TemplateCache(tmp_path / "cache", 1024 * 1024)
+    assert cache.get(template) is None
+
+    compiled = compile_template(str(template))
+    cache.put(template, compiled)
+    cache.save()
+
+    cache = TemplateCache(tmp_path / "cache", 1024 * 1024)
+    assert cache.get(template) == compiled.tokens
+
+    # Touched but not changed: the content is hashed again and the tokens are reused
+    stat = template.stat()
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    assert cache.hash(template) == compiled.hash
+    assert cache.get(template) == compiled.tokens
+
+    # Same size and mtime: the template is not read
+    template.write_text("{{colors.fg1}}\n")
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    assert cache.get(template) == compiled.tokens
+
+    # Different mtime or size
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2000))
+    assert cache.get(template) is None
+    template.write_text("{{colors.blue}}\n")
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2000))
+    assert cache.get(template) is None
+
+
+def test_template_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    # Uses are only recorded every USED_RESOLUTION seconds
+    clock = itertools.count(step=USED_RESOLUTION)
+    monkeypatch.setattr("dotmix.template.time", SimpleNamespace(time=clock.__next__))
+
+    cache = TemplateCache(tmp_path / "cache", 1024 * 1024)
+    hashes = []
+    for name in ["a", "b", "c"]:
+        template = tmp_path / name
+        template.write_text(f"{{{{colors.{name}}}}}\n")
+        compiled = compile_template(str(template))
+        cache.put(template, compiled)
+        hashes.append(compiled.hash)
+
+    # a is used by an incremental run (without loading its tokens), b is not used
+    assert cache.get_dependencies(hashes[0]) is not None
+    assert cache.get(tmp_path / "c") is not None
+
+    cache.max_size = sum(e["size"] for e in cache._entries.values()) - 1
+    cache.save()
+
+    cache = TemplateCache(tmp_path / "cache", cache.max_size)
+    assert cache.get(tmp_path / "a") is not None
+    assert cache.get(tmp_path / "b") is None
+    assert cache.get(tmp_path / "c") is not None
+
+
+def test_template_cache_merges_the_index_of_other_processes(tmp_path):
+    first = TemplateCache(tmp_path / "cache", 1024 * 1024)
+    second = TemplateCache(tmp_path / "cache", 1024 * 1024)
+
+    for cache, name in [(first, "a"), (second, "b")]:
+        template = tmp_path / name
+        template.write_text(f"{{{{colors.{name}}}}}\n")
+        cache.put(template, compile_template(str(template)))
+        cache.save()
+
+    cache = TemplateCache(tmp_path / "cache", 1024 * 1024)
+    assert cache.get(tmp_path / "a") is not None
+    assert cache.get(tmp_path / "b") is not None
@@ -0,0 +1,44 @@
+import pytest
+
+from dotmix.watch import get_changed_categories, get_watcher, read_changes
+
+
+@pytest.mark.parametrize("poll", [False, True])
+def test_watcher(tmp_path, poll):
+    (tmp_path / "dir").mkdir()
+
+    with get_watcher([tmp_path], poll) as watcher:
+        (tmp_path / "dir" / "file").write_text("content")
+
+        assert tmp_path / "dir" / "file" in read_changes(watcher, 0.3)
+
+        (tmp_path / "new").mkdir()
+        (tmp_path / "new" / "file").write_text("content")
+
+        assert tmp_path / "new" / "file" in read_changes(watcher, 0.3)
+
+
+def test_changed_categories(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOTMIX_DATA_DIR", str(tmp_path))
+    fileset_dir = tmp_path / "filesets" / "base"
+    fileset_dir.mkdir(parents=True)
+    (fileset_dir / "settings.toml").write_text('name = "Base"\n')
+    (fileset_dir / "template").write_text("{{colors.red}}\n")
+    (fileset_dir / "new").write_text("{{colors.red}}\n")
+    templates = {fileset_dir / "template"}
+
+    assert get_changed_categories([fileset_dir / "template"], templates) == set()
+    assert get_changed_categories(
+        [tmp_path / "colorschemes" / "base.toml"], templates
+    ) == {"colorschemes"}
+    assert get_changed_categories([fileset_dir / "settings.toml"], templates) == {
+        "filesets"
+    }
+
+    assert get_changed_categories([fileset_dir / "new"], templates) == {"filesets"}
+    assert templates == {fileset_dir / "template", fileset_dir / "new"}
+    assert get_changed_categories([fileset_dir / "new"], templates) == set()
+
+    (fileset_dir / "template").unlink()
+    assert get_changed_categories([fileset_dir / "template"], templates) == {"filesets"}
+    assert templates == {fileset_dir / "new"}